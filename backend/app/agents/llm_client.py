@@ -0,0 +1,214 @@
+import os
+import json
+import random
+import asyncio
+import inspect
+import threading
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+
+from backend.app.utils.logging_config import logger
+from backend.app.utils.metrics import Counter
+
+# Chat completion client for the agent path.
+#
+# Every worker process shares one AsyncOpenAI client with a bounded
+# connection pool. It lives on a private event loop thread, so the
+# synchronous job code submits coroutines with LLMClient.run() and can issue
+# many requests concurrently without holding a thread per request. At most
+# LLM_MAX_IN_FLIGHT requests per process are in flight; further requests
+# queue on a semaphore. Requests time out after LLM_TIMEOUT seconds and
+# transient failures (timeouts, connection errors, 429 and 5xx) are retried
+# with exponential backoff and jitter, honouring Retry-After. openai is only
+# imported when the first request is made.
+#
+# OPENAI_BASE_URL points the client at another endpoint, such as
+# scripts/fake_llm_server.py.
+
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o')
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', 8))  # per worker process
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 4))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))  # seconds before the first retry
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 30))
+
+LLM_REQUESTS = Counter("plagiarism_llm_requests", "Chat completion attempts by result.", ("result",))
+
+# HTTP statuses worth retrying besides 429 and 5xx
+_RETRY_STATUSES = (408, 409)
+
+def function_schema(func: Callable) -> Dict:
+    """
+    Describes a Python function as a chat completion tool.
+
+    :param func: Function whose parameters are all strings.
+    :return: Tool definition with the function's name, docstring and parameters.
+    """
+    parameters = inspect.signature(func).parameters
+    return {
+        'type': 'function',
+        'function': {
+            'name': func.__name__,
+            'description': inspect.getdoc(func) or "",
+            'parameters': {
+                'type': 'object',
+                'properties': {name: {'type': 'string'} for name in parameters},
+                'required': [name for name, parameter in parameters.items()
+                             if parameter.default is inspect.Parameter.empty],
+            },
+        },
+    }
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Returns how long to wait before retrying a failed request, or None if it should not be retried.
+    """
+    import openai
+
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status != 429 and status < 500 and status not in _RETRY_STATUSES:
+            return None
+    elif not isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return None
+    delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+    response = getattr(error, 'response', None)
+    try:
+        retry_after = float(response.headers.get('retry-after')) if response is not None else None
+    except (TypeError, ValueError):
+        retry_after = None
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+class LLMClient:
+    """
+    Pooled, rate-limited chat completion client running on its own event loop.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    def _get_client(self):
+        # Called on the loop thread, so the connection pool belongs to this loop
+        if self._client is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                logger.error("OPENAI_API_KEY not found in environment variables")
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            import httpx
+            import openai
+
+            logger.info(f"Initializing OpenAI client with at most {self.max_in_flight} requests in flight")
+            self._client = openai.AsyncOpenAI(
+                api_key=api_key,
+                timeout=httpx.Timeout(self.timeout, connect=LLM_CONNECT_TIMEOUT),
+                max_retries=0,  # retried in complete(), outside the semaphore
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=self.max_in_flight,
+                                        max_keepalive_connections=self.max_in_flight),
+                ),
+            )
+        return self._client
+
+    async def complete(self, **request) -> Any:
+        """
+        Creates a chat completion, waiting for a free request slot and retrying transient failures.
+
+        :param request: Arguments of chat.completions.create(); ``model`` defaults to LLM_MODEL.
+        :return: The ChatCompletion.
+        :raises openai.OpenAIError: If the request fails for good.
+        """
+        request.setdefault('model', LLM_MODEL)
+        client = self._get_client()
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                try:
+                    response = await client.chat.completions.create(**request)
+                except Exception as e:
+                    error = e
+                    delay = _retry_delay(e, attempt) if attempt < self.max_retries else None
+                    if delay is None:
+                        LLM_REQUESTS.inc('error')
+                        raise
+                else:
+                    LLM_REQUESTS.inc('ok')
+                    return response
+            # The slot is released while waiting, so other requests can proceed
+            LLM_REQUESTS.inc('retry')
+            attempt += 1
+            logger.warning(f"Chat completion failed ({type(error).__name__}: {error}); "
+                           f"retry {attempt} of {self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+        Runs a coroutine on the client's event loop and waits for its result.
+
+        :param coroutine: Coroutine to run, typically gathering several complete() calls.
+        :return: Its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def call_tools(self, message: Any, functions: Dict[str, Callable]) -> List[Tuple[str, str]]:
+        """
+        Runs the tool calls of an assistant message in threads, concurrently.
+
+        :param message: Assistant message of a ChatCompletion.
+        :param functions: Tool name to function.
+        :return: (tool name, result) per call, in call order. A call whose
+            arguments are not a JSON object gets an error message as its result.
+        """
+        def invoke(call):
+            try:
+                arguments = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                arguments = e
+            if not isinstance(arguments, dict):
+                logger.warning(f"Model called {call.function.name} with malformed arguments: {arguments}")
+                return f"Error: malformed arguments for {call.function.name}"
+            function = functions[call.function.name]
+            try:
+                inspect.signature(function).bind(**arguments)
+            except TypeError as e:
+                logger.warning(f"Model called {call.function.name} with invalid arguments: {e}")
+                return f"Error: invalid arguments for {call.function.name}"
+            return function(**arguments)
+
+        calls = [call for call in message.tool_calls or () if call.function.name in functions]
+        for call in message.tool_calls or ():
+            if call.function.name not in functions:
+                logger.warning(f"Model called unknown tool {call.function.name}")
+        results = await asyncio.gather(*(asyncio.to_thread(invoke, call) for call in calls))
+        return [(call.function.name, str(result)) for call, result in zip(calls, results)]
+
+    def close(self):
+        """
+        Closes the connection pool and stops the event loop.
+        """
+        if self._client is not None:
+            self.run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """
+    Returns the process-wide LLM client, starting its event loop on first use.
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
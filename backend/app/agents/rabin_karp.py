@@ -1,109 +1,663 @@
 import os
+import time
 import logging
-from typing import List, Dict, Tuple
-from backend.app.utils.logging_config import logger
+import threading
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Dict, Optional, Set, Tuple, Union
+import numpy as np
+from backend.app.utils.logging_config import debug_sampled, logger, setup_logging
+from backend.app.utils.metrics import INDEX_FINGERPRINTS, timed
+from backend.app.agents.shards import ShardClient, get_shard_client
+from backend.app.utils.fingerprints import (
+    DEFAULT_NGRAM_SIZE,
+    FINGERPRINT_WINDOW,
+    HASH_BASE,
+    iter_words,
+    preprocess_text,
+    rolling_hashes,
+    rolling_token_hashes,
+    shard_bounds,
+    shard_of,
+    token_hash,
+)
+from backend.app.database.fingerprint_store import (
+    FingerprintSegment,
+    build_segment,
+    load_or_compute_fingerprint_arrays,
+    open_segment,
+)
 
-def preprocess_text(text: str) -> List[str]:
+SOURCE_DOCS_PATH = os.getenv('SOURCE_DOCS_PATH', os.path.join(os.path.dirname(__file__), '..', '..', '..', 'source_documents'))
+SOURCE_INDEX_REFRESH_INTERVAL = float(os.getenv('SOURCE_INDEX_REFRESH_INTERVAL', 5))
+SEGMENT_REBUILD_THRESHOLD = int(os.getenv('SEGMENT_REBUILD_THRESHOLD', 64))
+SOURCE_TEXT_CACHE_SIZE = int(os.getenv('SOURCE_TEXT_CACHE_SIZE', 32))
+DETECTION_ENGINE = os.getenv('DETECTION_ENGINE', 'python')
+TARGET_BLOCK_WORDS = int(os.getenv('TARGET_BLOCK_WORDS', 65536))
+PASSAGE_EXCERPT_WORDS = int(os.getenv('PASSAGE_EXCERPT_WORDS', 12))
+DETECTION_WORKERS = int(os.getenv('DETECTION_WORKERS', 1))
+DETECTION_START_METHOD = os.getenv('DETECTION_START_METHOD', 'spawn')
+
+class SourceIndex:
+    """
+    Process-wide fingerprint index over the source documents.
+
+    Fingerprints live in a memory-mapped corpus segment (see
+    database/fingerprint_store.py) that is built once and shared through the
+    page cache. Documents added or changed since the segment was built are
+    kept in a small in-memory delta, and segment entries of changed or removed
+    documents are masked out. The token IDs of every document are stored next
+    to its fingerprints, so hits are verified and extended without reading
+    the source text; once the delta grows past
+    ``rebuild_threshold`` documents the segment is rebuilt. The directory scan
+    itself is throttled to once per ``refresh_interval`` seconds, so lookups do
+    not pay for the corpus size.
+
+    With ``shards`` above 1 the index only holds the fingerprints whose hash
+    falls in range ``shard`` (see shard_of()), so a corpus too large for one
+    machine can be split across shard servers (see agents/shards.py).
+    """
+
+    def __init__(self, n: int, window: int = FINGERPRINT_WINDOW, source_dir: str = SOURCE_DOCS_PATH,
+                 refresh_interval: float = SOURCE_INDEX_REFRESH_INTERVAL,
+                 rebuild_threshold: int = SEGMENT_REBUILD_THRESHOLD, shard: int = 0, shards: int = 1):
+        self.n = n
+        self.window = window
+        self.shard = shard
+        self.shards = shards
+        self.source_dir = source_dir
+        self.refresh_interval = refresh_interval
+        self.rebuild_threshold = rebuild_threshold
+        self.segment: Optional[FingerprintSegment] = None
+        self._masked: Set[str] = set()
+        self._delta: Dict[int, List[Tuple[str, int]]] = {}
+        self._delta_files: Dict[str, Tuple[int, int]] = {}
+        self._delta_hashes: Dict[str, List[int]] = {}
+        self._delta_tokens: Dict[str, memoryview] = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        segment_size = len(self.segment) if self.segment is not None else 0
+        return segment_size + sum(len(hashes) for hashes in self._delta_hashes.values())
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        current = {}
+        with os.scandir(self.source_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.txt') and entry.is_file():
+                    stat = entry.stat()
+                    current[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return current
+
+    def _remove_delta_file(self, filename: str):
+        for h in set(self._delta_hashes.pop(filename, ())):
+            entries = [entry for entry in self._delta.get(h, ()) if entry[0] != filename]
+            if entries:
+                self._delta[h] = entries
+            else:
+                self._delta.pop(h, None)
+        self._delta_files.pop(filename, None)
+        self._delta_tokens.pop(filename, None)
+
+    def _add_delta_file(self, filename: str, signature: Tuple[int, int]):
+        doc_hashes, positions, tokens = load_or_compute_fingerprint_arrays(
+            os.path.join(self.source_dir, filename), self.n, self.window)
+        hashes = []
+        for h, position in zip(doc_hashes, positions):
+            if self.shards > 1 and shard_of(h, self.shards) != self.shard:
+                continue
+            self._delta.setdefault(h, []).append((filename, position))
+            hashes.append(h)
+        self._delta_hashes[filename] = hashes
+        self._delta_tokens[filename] = memoryview(tokens)
+        self._delta_files[filename] = signature
+
+    def _rebuild(self, current: Dict[str, Tuple[int, int]]):
+        build_segment(self.source_dir, self.n, current, self.window, self.shard, self.shards)
+        self.segment = open_segment(self.source_dir, self.n, self.window, self.shard, self.shards)
+        self._masked = set()
+        self._delta, self._delta_files, self._delta_hashes, self._delta_tokens = {}, {}, {}, {}
+
+    def refresh(self, force: bool = False):
+        """
+        Brings the index up to date with the source directory.
+
+        :param force: Rescan even if the refresh interval has not elapsed.
+        """
+        now = time.monotonic()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return
+
+        with self._lock:
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return
+
+            with timed('index_load'):
+                current = self._scan()
+                if self.segment is None or not self.segment.is_current():
+                    # Another process may have rebuilt the segment; remap it.
+                    self.segment = open_segment(self.source_dir, self.n, self.window, self.shard, self.shards)
+                if self.segment is None:
+                    self._rebuild(current)
+                    self._last_refresh = time.monotonic()
+                    INDEX_FINGERPRINTS.set(len(self), str(self.n))
+                    return
+
+                indexed = self.segment.signatures
+                self._masked = {filename for filename, signature in indexed.items() if current.get(filename) != signature}
+                pending = {filename: signature for filename, signature in current.items() if indexed.get(filename) != signature}
+
+                if len(pending) > self.rebuild_threshold:
+                    logger.info(f"Source index n={self.n}: {len(pending)} documents changed, rebuilding segment.")
+                    self._rebuild(current)
+                    self._last_refresh = time.monotonic()
+                    INDEX_FINGERPRINTS.set(len(self), str(self.n))
+                    return
+
+                for filename in [f for f in self._delta_files if self._delta_files[f] != pending.get(f)]:
+                    self._remove_delta_file(filename)
+                added = [f for f in pending if f not in self._delta_files]
+                for filename in added:
+                    try:
+                        self._add_delta_file(filename, pending[filename])
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Failed to index source document {filename}: {e}")
+
+                if added:
+                    logger.info(
+                        f"Source index n={self.n} refreshed: {len(added)} added/changed, "
+                        f"{len(self._masked)} masked in segment, {len(self)} fingerprints."
+                    )
+                self._last_refresh = time.monotonic()
+                INDEX_FINGERPRINTS.set(len(self), str(self.n))
+
+    def lookup(self, h: int) -> List[Tuple[str, int]]:
+        """
+        Returns the (source_file, position) postings stored for a hash.
+
+        :param h: Hash value of an n-gram.
+        :return: List of (source_file, position) tuples, empty if unknown.
+        """
+        results = []
+        segment = self.segment
+        if segment is not None:
+            masked = self._masked
+            for doc_id, position in segment.lookup(h):
+                source_file = segment.docs[doc_id]
+                if source_file not in masked:
+                    results.append((source_file, position))
+        results.extend(self._delta.get(h, ()))
+        return results
+
+    def lookup_many(self, hashes: np.ndarray) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """
+        Vectorized lookup() used by the numpy engine and the detection workers:
+        the segment postings of all hashes are fetched in one pass, and only
+        hashes in the small delta are looked up one by one.
+
+        :param hashes: uint64 array of n-gram hashes.
+        :return: (index into ``hashes``, source_file, position) per posting,
+            ordered by hash index.
+        """
+        which_parts, file_parts, position_parts = [], [], []
+        segment = self.segment
+        if segment is not None and len(segment):
+            which, doc_ids, positions = segment.lookup_many(hashes)
+            masked = self._masked
+            if masked and len(doc_ids):
+                masked_ids = [doc_id for doc_id, source_file in enumerate(segment.docs) if source_file in masked]
+                keep = ~np.isin(doc_ids, masked_ids)
+                which, doc_ids, positions = which[keep], doc_ids[keep], positions[keep]
+            which_parts.append(which)
+            file_parts.append(segment.doc_names[doc_ids])
+            position_parts.append(positions)
+        delta = self._delta
+        if delta:
+            in_delta = np.flatnonzero(np.isin(hashes, np.fromiter(delta.keys(), dtype=np.uint64, count=len(delta))))
+            entries = [(i, source_file, position) for i in in_delta.tolist()
+                       for source_file, position in delta.get(int(hashes[i]), ())]
+            if entries:
+                which, files, positions = zip(*entries)
+                which_parts.append(np.array(which, dtype=np.int64))
+                file_parts.append(np.array(files, dtype=object))
+                position_parts.append(np.array(positions, dtype=np.int64))
+        if not which_parts:
+            return np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64)
+        which = np.concatenate(which_parts)
+        files = np.concatenate(file_parts)
+        positions = np.concatenate(position_parts)
+        if len(which_parts) > 1:
+            order = np.argsort(which, kind='stable')
+            which, files, positions = which[order], files[order], positions[order]
+        return which, files.tolist(), positions
+
+    def tokens(self, source_file: str) -> memoryview:
+        """
+        Returns the token IDs (64-bit token hashes) of a source document, for
+        verifying hash hits and extending matches without comparing strings.
+
+        The IDs come from the mapped segment or the delta; callers slice out
+        the window they compare, so nothing is read from the source file.
+
+        :param source_file: Name of the source document.
+        :return: uint64 memoryview with one token ID per word, empty if the document is not indexed.
+        """
+        tokens = self._delta_tokens.get(source_file)
+        if tokens is not None:
+            return tokens
+        segment = self.segment
+        if segment is not None and source_file not in self._masked:
+            doc_id = segment.doc_ids.get(source_file)
+            if doc_id is not None:
+                return segment.tokens(doc_id)
+        return _NO_TOKENS
+
+    def text_at(self, source_file: str, start: int, end: int) -> str:
+        """
+        Materializes a range of words of a source document.
+
+        :param source_file: Name of the source document.
+        :param start: First word position.
+        :param end: Word position after the last word.
+        :return: The normalized words joined by spaces, empty if the document is unreadable.
+        """
+        path = os.path.join(self.source_dir, source_file)
+        try:
+            words = _source_words(path, os.stat(path).st_mtime_ns)
+        except OSError:
+            return ""
+        return " ".join(words[start:end])
+
+_NO_TOKENS = memoryview(array('Q'))
+
+@lru_cache(maxsize=SOURCE_TEXT_CACHE_SIZE)
+def _source_words(path: str, mtime_ns: int) -> Tuple[str, ...]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return tuple(preprocess_text(f.read()))
+
+_source_indexes: Dict[Tuple[int, int], SourceIndex] = {}
+_source_indexes_lock = threading.Lock()
+
+def get_source_index(n: int, window: int = FINGERPRINT_WINDOW) -> SourceIndex:
     """
-    Preprocesses the text by converting to lowercase and splitting into words.
+    Returns the process-wide source index for n-grams of size n, building it on first use.
 
-    :param text: The text to preprocess.
-    :return: List of words.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window of the source fingerprints.
+    :return: An up-to-date SourceIndex.
     """
-    logger.debug("Preprocessing text for n-gram generation.")
-    # Replace newlines and multiple spaces with a single space
-    text = text.replace('\n', ' ').replace('\r', ' ').strip()
-    processed = ' '.join(text.split()).lower().split()
-    logger.debug(f"Preprocessed text: {processed[:10]}...")  # Show first 10 words for brevity
-    return processed
+    key = (n, window)
+    index = _source_indexes.get(key)
+    if index is None:
+        with _source_indexes_lock:
+            index = _source_indexes.get(key)
+            if index is None:
+                index = SourceIndex(n, window)
+                _source_indexes[key] = index
+    index.refresh()
+    return index
 
-def generate_ngrams(words: List[str], n: int) -> List[Tuple[str, int]]:
+def token_array(words: List[str]) -> np.ndarray:
     """
-    Generates n-grams from a list of words.
+    Maps words to their token IDs (64-bit token hashes) as an array.
+
+    Each distinct word is hashed once through an integer vocabulary.
 
     :param words: List of words.
-    :param n: Size of the n-gram.
-    :return: List of tuples containing n-gram and its position.
+    :return: uint64 array with one token ID per word.
     """
-    logger.debug(f"Generating {n}-grams from words.")
-    ngrams = [(" ".join(words[i:i+n]), i) for i in range(len(words) - n + 1)]
-    logger.debug(f"Generated {len(ngrams)} n-grams.")
-    return ngrams
+    vocab: Dict[str, int] = {}
+    token_ids = np.fromiter((vocab.setdefault(word, len(vocab)) for word in words), dtype=np.int64, count=len(words))
+    vocab_hashes = np.fromiter((token_hash(word) for word in vocab), dtype=np.uint64, count=len(vocab))
+    return vocab_hashes[token_ids]
 
-def compute_hash(ngram: str, base: int = 256, mod: int = 10**9 + 7) -> int:
+def window_hashes(tokens: np.ndarray, n: int) -> np.ndarray:
     """
-    Computes a simple rolling hash for an n-gram.
+    Folds token IDs into n-gram window hashes with n shifted multiply-adds
+    over uint64 arrays. Overflow wraps modulo 2**64, so the result equals
+    rolling_hashes() exactly.
 
-    :param ngram: The n-gram string.
-    :param base: Base number for hashing.
-    :param mod: Modulus value for hashing.
-    :return: Hash value.
+    :param tokens: uint64 array of token IDs, see token_array().
+    :param n: Size of the n-grams.
+    :return: uint64 array where element i is the hash of the window starting at i.
     """
-    logger.debug(f"Computing hash for n-gram: '{ngram}'.")
-    h = 0
-    for char in ngram:
-        h = (h * base + ord(char)) % mod
-    logger.debug(f"Hash for n-gram '{ngram}': {h}")
-    return h
+    count = len(tokens) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    base = np.uint64(HASH_BASE)
+    hashes = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for k in range(n):
+            hashes = hashes * base + tokens[k:k + count]
+    return hashes
+
+def _python_candidates(tokens: np.ndarray, n: int, source_index: SourceIndex) -> List[Tuple[int, str, int]]:
+    with timed('hash'):
+        hashes = list(rolling_token_hashes(tokens.tolist(), n))
+    hits = []
+    with timed('lookup'):
+        for h, position in hashes:
+            for source_file, source_position in source_index.lookup(h):
+                hits.append((position, source_file, source_position))
+    return hits
+
+def _numpy_candidates(tokens: np.ndarray, n: int, source_index: SourceIndex) -> List[Tuple[int, str, int]]:
+    with timed('hash'):
+        hashes = window_hashes(tokens, n)
+    with timed('lookup'):
+        positions, files, source_positions = source_index.lookup_many(hashes)
+        return list(zip(positions.tolist(), files, source_positions.tolist()))
 
-def load_source_ngrams(n: int) -> Dict[int, List[Tuple[str, str]]]:
+def _word_blocks(words: Iterable[str], n: int, block_words: int) -> Iterator[Tuple[int, List[str]]]:
     """
-    Loads n-gram hashes from all source documents.
+    Groups a word stream into blocks that overlap by n - 1 words, so every
+    n-gram lies entirely inside exactly one block.
 
+    :param words: Iterable of words.
     :param n: Size of the n-grams.
-    :return: Dictionary mapping hash values to list of (source_file, ngram) tuples.
-    """
-    logger.info(f"Loading source n-grams with n={n}.")
-    source_ngrams = {}
-    source_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'source_documents')
-    
-    for filename in os.listdir(source_dir):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(source_dir, filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            words = preprocess_text(content)
-            ngrams = generate_ngrams(words, n)
-            
-            for ngram, _ in ngrams:
-                h = compute_hash(ngram)
-                if h not in source_ngrams:
-                    source_ngrams[h] = []
-                source_ngrams[h].append((filename, ngram))
-    
-    logger.info(f"Loaded n-grams from {len(source_ngrams)} unique hashes.")
-    return source_ngrams
-
-def rabin_karp_plagiarism(target_text: str, n: int = 5, threshold: int = 3) -> List[Dict]:
+    :param block_words: Number of n-grams started per block.
+    :return: Iterator of (offset of the block's first word, block words).
+    """
+    offset = 0
+    block = []
+    for word in words:
+        block.append(word)
+        if len(block) == block_words + n - 1:
+            yield offset, block
+            offset += block_words
+            block = block[block_words:]
+    if len(block) >= n:
+        yield offset, block
+
+def _timed_word_blocks(words: Iterable[str], n: int) -> Iterator[Tuple[int, List[str]]]:
+    # _word_blocks() of TARGET_BLOCK_WORDS, with reading and normalizing the
+    # words of each block timed as tokenization.
+    blocks = _word_blocks(words, n, TARGET_BLOCK_WORDS)
+    while True:
+        with timed('tokenize'):
+            item = next(blocks, None)
+        if item is None:
+            return
+        yield item
+
+# Candidate matching engines: map the token IDs of a word block (see
+# token_array()) to its hash hits as (block position, source_file,
+# source_position), in increasing block position.
+DETECTION_ENGINES = {
+    'python': _python_candidates,
+    'numpy': _numpy_candidates,
+}
+
+def _block_tokens(tokens: np.ndarray) -> array:
+    # The token IDs of a block as an array('Q'), for comparing with source token slices.
+    block_tokens = array('Q')
+    block_tokens.frombytes(tokens.tobytes())
+    return block_tokens
+
+def _verified_hits(words: Iterable[str], n: int, engine: str,
+                   source_index: SourceIndex) -> Iterator[Tuple[int, str, int, str]]:
+    """
+    Hashes a word stream block by block and yields the hash hits confirmed against the source text.
+
+    :param words: Iterable of target words.
+    :param n: Size of the n-grams.
+    :param engine: Key of DETECTION_ENGINES.
+    :param source_index: Index to probe.
+    :return: Iterator of (position_in_target, source_file, source_position, ngram)
+        in increasing target position.
+    """
+    hashed = 0
+    for offset, block in _timed_word_blocks(words, n):
+        hashed += len(block) - n + 1
+        with timed('tokenize'):
+            tokens = token_array(block)
+            block_tokens = _block_tokens(tokens)
+        hits = DETECTION_ENGINES[engine](tokens, n, source_index)
+        verified = []
+        with timed('verify'):
+            for block_position, source_file, source_position in hits:
+                window_tokens = block_tokens[block_position:block_position + n]
+                if window_tokens == source_index.tokens(source_file)[source_position:source_position + n]:
+                    ngram = " ".join(block[block_position:block_position + n])
+                    verified.append((offset + block_position, source_file, source_position, ngram))
+        yield from verified
+    if debug_sampled():
+        logger.debug("Hashed %d n-grams from target text", hashed)
+
+def _extend_hits(block_tokens: array, hits: Iterable[Tuple[int, str, int]], n: int,
+                 source_index: SourceIndex) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Grows every confirmed hit into the longest exact match around it by
+    comparing token IDs on both sides.
+
+    Hits that fall inside a match already found on the same diagonal are
+    skipped without verification, so a copied passage costs one extension
+    rather than one comparison per n-gram.
+
+    :param block_tokens: Token IDs of the word block.
+    :param hits: (position in block, source_file, source_position) from a detection engine.
+    :param n: Size of the n-grams.
+    :param source_index: Index the candidates came from.
+    :return: Iterator of (source_file, target_start, target_end, source_start),
+        with target offsets relative to the block.
+    """
+    extended: Dict[Tuple[str, int], int] = {}
+    for position, source_file, source_position in hits:
+        diagonal = position - source_position
+        if position + n <= extended.get((source_file, diagonal), -1):
+            continue
+        source_tokens = source_index.tokens(source_file)
+        if block_tokens[position:position + n] != source_tokens[source_position:source_position + n]:
+            continue
+        start, end = position, position + n
+        while start > 0 and start - diagonal > 0 and block_tokens[start - 1] == source_tokens[start - 1 - diagonal]:
+            start -= 1
+        while (end < len(block_tokens) and end - diagonal < len(source_tokens)
+               and block_tokens[end] == source_tokens[end - diagonal]):
+            end += 1
+        extended[(source_file, diagonal)] = end
+        yield source_file, start, end, start - diagonal
+
+def _extended_matches(words: Iterable[str], n: int, engine: str,
+                      source_index: SourceIndex) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Probes a word stream block by block and yields the exact matches around
+    its confirmed hits (see _extend_hits()). Matches are confined to one word
+    block; merge_spans() joins the pieces of a match that crosses blocks.
+
+    :param words: Iterable of target words.
+    :param n: Size of the n-grams.
+    :param engine: Key of DETECTION_ENGINES.
+    :param source_index: Index to probe.
+    :return: Iterator of (source_file, target_start, target_end, source_start) word spans.
+    """
+    hashed = 0
+    for offset, block in _timed_word_blocks(words, n):
+        hashed += len(block) - n + 1
+        with timed('tokenize'):
+            tokens = token_array(block)
+        hits = DETECTION_ENGINES[engine](tokens, n, source_index)
+        with timed('verify'):
+            block_tokens = _block_tokens(tokens)
+            matches = list(_extend_hits(block_tokens, hits, n, source_index))
+        for source_file, start, end, source_start in matches:
+            yield source_file, offset + start, offset + end, source_start
+    if debug_sampled():
+        logger.debug("Hashed %d n-grams from target text", hashed)
+
+def _init_detection_worker():
+    setup_logging()
+    index = get_source_index(DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW)
+    logger.info(f"Detection worker {os.getpid()} ready with {len(index)} source fingerprints")
+
+def probe_block(source_index: SourceIndex, n: int, tokens: bytes, positions: np.ndarray,
+                hashes: np.ndarray) -> List[Tuple[str, int, int, int]]:
+    """
+    Probes some n-grams of a word block against an index, then verifies and extends the hits.
+
+    This is the unit of work of both the detection pool and the shard servers.
+
+    :param source_index: Index to probe, possibly a single shard.
+    :param n: Size of the n-grams.
+    :param tokens: Token IDs of the whole block, as uint64 bytes, for verification and extension.
+    :param positions: Block positions of the n-grams to probe.
+    :param hashes: Their hashes.
+    :return: Exact matches as (source_file, target_start, target_end, source_start), block-relative.
+    """
+    block_tokens = array('Q')
+    block_tokens.frombytes(tokens)
+    which, files, source_positions = source_index.lookup_many(hashes)
+    hits = zip(positions[which].tolist(), files, source_positions.tolist())
+    return list(_extend_hits(block_tokens, hits, n, source_index))
+
+def _probe_shard(n: int, window: int, tokens: bytes, positions: np.ndarray,
+                 hashes: np.ndarray) -> List[Tuple[str, int, int, int]]:
+    # Runs inside a detection worker; see probe_block().
+    return probe_block(get_source_index(n, window), n, tokens, positions, hashes)
+
+_detection_pool: Optional[ProcessPoolExecutor] = None
+_detection_pool_lock = threading.Lock()
+
+def get_detection_pool(workers: int = DETECTION_WORKERS) -> ProcessPoolExecutor:
+    """
+    Returns the process-wide pool of detection workers, starting it on first use.
+
+    Each worker maps the corpus segment itself, so all of them share one copy
+    of the index through the page cache.
+
+    :param workers: Number of worker processes.
+    :return: The shared ProcessPoolExecutor.
+    """
+    global _detection_pool
+    with _detection_pool_lock:
+        if _detection_pool is None:
+            _detection_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(DETECTION_START_METHOD),
+                initializer=_init_detection_worker,
+            )
+            logger.info(f"Started {workers} detection workers")
+        return _detection_pool
+
+def _sharded_matches(words: Iterable[str], n: int, window: int, workers: int) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Parallel counterpart of _extended_matches(): every word block is hashed
+    once, split by hash range into ``workers`` shards and each shard is probed,
+    verified and extended by its own detection worker. At most two blocks per
+    worker are in flight, so memory stays bounded.
+
+    :param words: Iterable of target words.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window of the source index.
+    :param workers: Number of hash-range shards, one per detection worker.
+    :return: Iterator of (source_file, target_start, target_end, source_start)
+        word spans, not ordered across shards.
+    """
+    pool = get_detection_pool(workers)
+    bounds = np.array(shard_bounds(workers), dtype=np.uint64)
+    pending = deque()
+
+    def collect(offset: int, future: Future) -> Iterator[Tuple[str, int, int, int]]:
+        # Probing, verification and extension run in the workers; the wait for them is counted as lookup.
+        with timed('lookup'):
+            matches = future.result()
+        for source_file, start, end, source_start in matches:
+            yield source_file, offset + start, offset + end, source_start
+
+    hashed = 0
+    for offset, block in _timed_word_blocks(words, n):
+        with timed('tokenize'):
+            tokens = token_array(block)
+        with timed('hash'):
+            hashes = window_hashes(tokens, n)
+        hashed += len(hashes)
+        shards = np.searchsorted(bounds, hashes, side='right')
+        positions = np.arange(len(hashes))
+        tokens_bytes = tokens.tobytes()
+        for shard in range(workers):
+            selected = shards == shard
+            if selected.any():
+                pending.append((offset, pool.submit(_probe_shard, n, window, tokens_bytes,
+                                                    positions[selected], hashes[selected])))
+        while len(pending) > 2 * workers:
+            yield from collect(*pending.popleft())
+    while pending:
+        yield from collect(*pending.popleft())
+    if debug_sampled():
+        logger.debug("Hashed %d n-grams from target text across %d shards", hashed, workers)
+
+def _remote_matches(words: Iterable[str], n: int, window: int,
+                    shard_client: ShardClient) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Counterpart of _extended_matches() for an index split across shard
+    servers: every word block is hashed once locally and scattered to the
+    shards by hash range; the shards probe, verify and extend in parallel.
+
+    :param words: Iterable of target words.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window of the source index.
+    :param shard_client: Client for the shard servers.
+    :return: Iterator of (source_file, target_start, target_end, source_start)
+        word spans, not ordered across shards.
+    """
+    hashed = 0
+    for offset, block in _timed_word_blocks(words, n):
+        with timed('tokenize'):
+            tokens = token_array(block)
+        with timed('hash'):
+            hashes = window_hashes(tokens, n)
+        hashed += len(hashes)
+        with timed('lookup'):
+            matches = shard_client.probe(n, window, tokens, hashes)
+        for source_file, start, end, source_start in matches:
+            yield source_file, offset + start, offset + end, source_start
+    if debug_sampled():
+        logger.debug("Hashed %d n-grams from target text across %d shard servers", hashed, len(shard_client))
+
+def _target_words(target_text: Union[str, Iterable[str]]) -> Iterator[str]:
+    return iter_words([target_text] if isinstance(target_text, str) else target_text)
+
+def rabin_karp_plagiarism(target_text: Union[str, Iterable[str]], n: int = DEFAULT_NGRAM_SIZE, threshold: int = 3,
+                          engine: str = DETECTION_ENGINE, window: int = FINGERPRINT_WINDOW) -> List[Dict]:
     """
     Identifies plagiarism by comparing target text against source documents using Rabin-Karp.
 
-    :param target_text: The text of the target document to analyze.
+    Reports every matching n-gram; see detect_passages() for matches merged into passages.
+
+    :param target_text: The text of the target document to analyze, or an
+        iterable of text chunks (see read_chunks()). Chunks are tokenized and
+        hashed in blocks of TARGET_BLOCK_WORDS words, so memory use does not
+        grow with the document.
     :param n: Size of the n-grams.
     :param threshold: Minimum number of matches required for plagiarism detection.
+    :param engine: Candidate matching engine, "python" (scalar rolling hash) or
+        "numpy" (vectorized hashing and one vectorized postings fetch per block).
+        Both return identical results.
+    :param window: Winnowing window of the source index. The target is always
+        hashed in full, so with a window above 1 every copied passage of at least
+        window + n - 1 words is still found, through its selected source n-grams.
     :return: List of plagiarism instances.
     """
-    logger.info(f"Starting Rabin-Karp plagiarism detection with n={n}, threshold={threshold}")
-    source_ngrams = load_source_ngrams(n)
-    logger.info(f"Loaded {len(source_ngrams)} source n-gram hashes")
+    if engine not in DETECTION_ENGINES:
+        raise ValueError(f"Unknown detection engine: {engine}. Available: {', '.join(DETECTION_ENGINES)}")
 
-    words = preprocess_text(target_text)
-    ngrams = generate_ngrams(words, n)
-    logger.info(f"Generated {len(ngrams)} n-grams from target text")
+    source_index = get_source_index(n, window)
+    if debug_sampled():
+        logger.debug("Starting Rabin-Karp plagiarism detection with n=%d, threshold=%d, engine=%s, window=%d, %d source fingerprints",
+                     n, threshold, engine, window, len(source_index))
 
     plagiarism_instances = []
     potential_matches = {}
 
-    for ngram, position in ngrams:
-        h = compute_hash(ngram)
-        if h in source_ngrams:
-            for source_file, source_ngram in source_ngrams[h]:
-                if ngram == source_ngram:
-                    logger.debug(f"Match found: '{ngram}' in {source_file} at position {position}")
-                    if source_file not in potential_matches:
-                        potential_matches[source_file] = []
-                    potential_matches[source_file].append((ngram, position))
+    for position, source_file, _, ngram in _verified_hits(_target_words(target_text), n, engine, source_index):
+        if source_file not in potential_matches:
+            potential_matches[source_file] = []
+        potential_matches[source_file].append((ngram, position))
 
     for source_file, matches in potential_matches.items():
         if len(matches) >= threshold:
@@ -113,7 +667,143 @@ def rabin_karp_plagiarism(target_text: str, n: int = 5, threshold: int = 3) -> L
                     'ngram': ngram,
                     'position_in_target': position
                 })
-            logger.info(f"Plagiarism detected: {len(matches)} matches found in {source_file}")
+            if debug_sampled():
+                logger.debug("Plagiarism detected: %d matches found in %s", len(matches), source_file)
 
-    logger.info(f"Plagiarism detection completed. Total instances found: {len(plagiarism_instances)}")
+    logger.info("Plagiarism detection completed. Total instances found: %d", len(plagiarism_instances))
     return plagiarism_instances
+
+def merge_spans(spans: Iterable[Tuple[int, int, int]]) -> List[Dict]:
+    """
+    Merges exact matches against one source into maximal passages.
+
+    Spans on the same diagonal (target position minus source position) that
+    overlap or touch are one copied passage split across word blocks. Each
+    span only looks up the open passage of its diagonal, so the merge is
+    linear in the number of spans. Passages whose target span lies inside a
+    longer passage (repeated phrases in the source) are dropped.
+
+    :param spans: (target_start, target_end, source_start) word spans, in
+        increasing target_start per diagonal.
+    :return: Passages as dicts with target_start, target_end, source_start,
+        source_end (word offsets, end exclusive) and length in words, ordered
+        by target_start.
+    """
+    open_passages: Dict[int, Dict] = {}
+    passages = []
+    for target_start, target_end, source_start in spans:
+        diagonal = target_start - source_start
+        passage = open_passages.get(diagonal)
+        if passage is not None and target_start <= passage['target_end']:
+            passage['target_end'] = max(passage['target_end'], target_end)
+        else:
+            passage = {'target_start': target_start, 'target_end': target_end, 'source_start': source_start}
+            open_passages[diagonal] = passage
+            passages.append(passage)
+
+    merged = []
+    covered_to = -1
+    for passage in sorted(passages, key=lambda p: (p['target_start'], -p['target_end'])):
+        if passage['target_end'] <= covered_to:
+            continue
+        covered_to = passage['target_end']
+        length = passage['target_end'] - passage['target_start']
+        merged.append({
+            'target_start': passage['target_start'],
+            'target_end': passage['target_end'],
+            'source_start': passage['source_start'],
+            'source_end': passage['source_start'] + length,
+            'length': length,
+        })
+    return merged
+
+def covered_words(passages: List[Dict]) -> int:
+    """
+    Counts the target words covered by at least one passage.
+
+    :param passages: Passages ordered by target_start, as returned by merge_spans().
+    :return: Number of covered target words.
+    """
+    covered = 0
+    covered_to = 0
+    for passage in passages:
+        start = max(passage['target_start'], covered_to)
+        if passage['target_end'] > start:
+            covered += passage['target_end'] - start
+            covered_to = passage['target_end']
+    return covered
+
+def detect_passages(target_text: Union[str, Iterable[str]], n: int = DEFAULT_NGRAM_SIZE, threshold: int = 3,
+                    engine: str = DETECTION_ENGINE, window: int = FINGERPRINT_WINDOW,
+                    workers: int = DETECTION_WORKERS) -> Dict:
+    """
+    Identifies plagiarized passages: every confirmed n-gram hit is extended to
+    the longest exact match around it and the matches are merged per source.
+
+    :param target_text: The target text, or an iterable of text chunks.
+    :param n: Size of the n-grams.
+    :param threshold: Minimum number of matching n-grams for a source to be reported.
+    :param engine: Candidate matching engine, see rabin_karp_plagiarism().
+    :param window: Winnowing window of the source index.
+    :param workers: Number of detection worker processes. Above 1 the index is
+        probed in parallel by hash range (see _sharded_matches()) and ``engine``
+        is ignored; the result is the same. When SHARD_ADDRESSES is set the
+        shard servers are queried instead (see agents/shards.py).
+    :return: Dict with the number of ``target_words`` and ``sources``: one entry
+        per reported source with its source_document, matched_ngrams,
+        coverage (percent of target words) and passages (see merge_spans(),
+        plus an ``excerpt`` of the first PASSAGE_EXCERPT_WORDS source words),
+        ordered by decreasing coverage.
+    """
+    if engine not in DETECTION_ENGINES:
+        raise ValueError(f"Unknown detection engine: {engine}. Available: {', '.join(DETECTION_ENGINES)}")
+
+    if debug_sampled():
+        logger.debug("Starting passage detection with n=%d, threshold=%d, engine=%s, window=%d, workers=%d",
+                     n, threshold, engine, window, workers)
+    shard_client = get_shard_client()
+    # With remote shards the local index is only used for excerpts, so it is never loaded.
+    source_index = SourceIndex(n, window) if shard_client is not None else get_source_index(n, window)
+
+    target_words = 0
+    def counted(words: Iterable[str]) -> Iterator[str]:
+        nonlocal target_words
+        for word in words:
+            target_words += 1
+            yield word
+
+    words = counted(_target_words(target_text))
+    if shard_client is not None:
+        matches = _remote_matches(words, n, window, shard_client)
+    elif workers > 1:
+        matches = _sharded_matches(words, n, window, workers)
+    else:
+        matches = _extended_matches(words, n, engine, source_index)
+    spans: Dict[str, List[Tuple[int, int, int]]] = {}
+    for source_file, target_start, target_end, source_start in matches:
+        spans.setdefault(source_file, []).append((target_start, target_end, source_start))
+
+    sources = []
+    with timed('aggregate'):
+        for source_file, source_spans in spans.items():
+            passages = merge_spans(sorted(source_spans))
+            matched_ngrams = sum(passage['length'] - n + 1 for passage in passages)
+            if matched_ngrams < threshold:
+                continue
+            for passage in passages:
+                excerpt_end = min(passage['source_end'], passage['source_start'] + PASSAGE_EXCERPT_WORDS)
+                passage['excerpt'] = source_index.text_at(source_file, passage['source_start'], excerpt_end)
+            sources.append({
+                'source_document': source_file,
+                'matched_ngrams': matched_ngrams,
+                'coverage': 100.0 * covered_words(passages) / target_words,
+                'passages': passages,
+            })
+            if debug_sampled():
+                logger.debug("Matched %d passages (%.1f%% of the target) from %s",
+                             len(passages), sources[-1]['coverage'], source_file)
+        sources.sort(key=lambda source: source['coverage'], reverse=True)
+
+    logger.info("Passage detection completed: %d passages from %d sources",
+                sum(len(source['passages']) for source in sources), len(sources))
+    return {'target_words': target_words, 'sources': sources}
@@ -0,0 +1,215 @@
+import os
+import argparse
+import threading
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.utils.logging_config import logger, setup_logging
+from backend.app.utils.fingerprints import DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW, shard_bounds
+
+# Scatter/gather access to a source index split into hash-range shards.
+#
+# Each shard server holds the fingerprints of one hash range (a SourceIndex
+# built with shard/shards, see agents/rabin_karp.py) and answers "probe"
+# requests: given the token IDs of a target word block and the n-grams of the
+# block that fall in its range, it looks them up, verifies and extends the
+# hits and returns the exact matches. The ShardClient splits every block by
+# hash range, sends each part to its shard concurrently and gathers the
+# matches. Shards talk over multiprocessing.connection, which pickles
+# messages, so SHARD_AUTHKEY must be a shared secret and the servers should
+# only listen on trusted networks.
+#
+# Shard servers need read access to the source documents for verification,
+# but each one only keeps its own part of the index in memory.
+
+SHARD_ADDRESSES = os.getenv('SHARD_ADDRESSES', '')
+SHARD_AUTHKEY = os.getenv('SHARD_AUTHKEY', '')
+
+def parse_addresses(addresses: str) -> List[Tuple[str, int]]:
+    """
+    Parses a comma-separated list of host:port shard addresses.
+
+    :param addresses: e.g. "10.0.0.1:6000,10.0.0.2:6000", in shard order.
+    :return: List of (host, port) tuples.
+    """
+    parsed = []
+    for address in addresses.split(','):
+        address = address.strip()
+        if address:
+            host, _, port = address.rpartition(':')
+            parsed.append((host or 'localhost', int(port)))
+    return parsed
+
+class ShardError(Exception):
+    """Raised when a shard server cannot be reached or fails a request."""
+
+class ShardClient:
+    """
+    Queries a set of shard servers, one connection per shard and thread.
+    """
+
+    def __init__(self, addresses: List[Tuple[str, int]], authkey: bytes):
+        self.addresses = addresses
+        self.authkey = authkey
+        self.bounds = np.array(shard_bounds(len(addresses)), dtype=np.uint64)
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def _connections(self) -> List[Connection]:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            try:
+                connections = [Client(address, authkey=self.authkey) for address in self.addresses]
+            except (OSError, AuthenticationError) as e:
+                raise ShardError(f"Cannot connect to shard servers {self.addresses}: {e}") from e
+            self._local.connections = connections
+        return connections
+
+    def _reset(self):
+        for connection in getattr(self._local, 'connections', None) or ():
+            connection.close()
+        self._local.connections = None
+
+    def _request(self, requests: Dict[int, tuple]) -> Dict[int, object]:
+        connections = self._connections()
+        try:
+            for shard, request in requests.items():
+                connections[shard].send(request)
+            replies = {shard: connections[shard].recv() for shard in requests}
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise ShardError(f"Lost connection to a shard server: {e}") from e
+
+        errors = [f"shard {shard}: {payload}" for shard, (status, payload) in replies.items() if status != 'ok']
+        if errors:
+            raise ShardError(f"Shard request failed: {'; '.join(errors)}")
+        return {shard: payload for shard, (_, payload) in replies.items()}
+
+    def info(self) -> List[Dict]:
+        """
+        Returns the configuration and size of every shard.
+        """
+        replies = self._request({shard: ('info',) for shard in range(len(self))})
+        return [replies[shard] for shard in range(len(self))]
+
+    def probe(self, n: int, window: int, tokens: np.ndarray, hashes: np.ndarray) -> List[Tuple[str, int, int, int]]:
+        """
+        Scatters the n-grams of a word block to their shards and gathers the matches.
+
+        :param n: Size of the n-grams.
+        :param window: Winnowing window of the source index.
+        :param tokens: uint64 token IDs of the block.
+        :param hashes: uint64 window hashes of the block, see window_hashes().
+        :return: Exact matches as (source_file, target_start, target_end, source_start), block-relative.
+        """
+        shards = np.searchsorted(self.bounds, hashes, side='right')
+        positions = np.arange(len(hashes))
+        tokens_bytes = tokens.tobytes()
+        requests = {}
+        for shard in range(len(self)):
+            selected = shards == shard
+            if selected.any():
+                requests[shard] = ('probe', n, window, tokens_bytes, positions[selected], hashes[selected])
+        matches = []
+        for payload in self._request(requests).values():
+            matches.extend(payload)
+        return matches
+
+_shard_client: Optional[ShardClient] = None
+
+def get_shard_client() -> Optional[ShardClient]:
+    """
+    Returns the shard client configured by SHARD_ADDRESSES, or None when the
+    index is local.
+
+    :raises ValueError: If SHARD_ADDRESSES is set without SHARD_AUTHKEY.
+    """
+    global _shard_client
+    if _shard_client is None and SHARD_ADDRESSES:
+        if not SHARD_AUTHKEY:
+            raise ValueError("SHARD_AUTHKEY must be set when SHARD_ADDRESSES is used")
+        _shard_client = ShardClient(parse_addresses(SHARD_ADDRESSES), SHARD_AUTHKEY.encode())
+    return _shard_client
+
+def _serve_connection(connection: Connection, source_index, n: int, window: int):
+    from backend.app.agents.rabin_karp import probe_block
+
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if request[0] == 'probe':
+                    _, request_n, request_window, tokens, positions, hashes = request
+                    if (request_n, request_window) != (n, window):
+                        raise ValueError(f"shard serves n={n}, window={window}, got n={request_n}, window={request_window}")
+                    source_index.refresh()
+                    reply = ('ok', probe_block(source_index, n, tokens, positions, hashes))
+                elif request[0] == 'info':
+                    reply = ('ok', {'shard': source_index.shard, 'shards': source_index.shards,
+                                    'n': n, 'window': window, 'fingerprints': len(source_index)})
+                else:
+                    raise ValueError(f"unknown request {request[0]!r}")
+            except Exception as e:
+                logger.exception(f"Shard request failed: {e}")
+                reply = ('error', f"{type(e).__name__}: {e}")
+            try:
+                connection.send(reply)
+            except OSError:
+                return
+
+def serve_shard(address: Tuple[str, int], shard: int, shards: int, authkey: bytes,
+                n: int = DEFAULT_NGRAM_SIZE, window: int = FINGERPRINT_WINDOW, source_dir: Optional[str] = None):
+    """
+    Loads one shard of the source index and serves probe requests until killed.
+
+    :param address: (host, port) to listen on.
+    :param shard: Hash-range shard to serve.
+    :param shards: Total number of shards.
+    :param authkey: Shared secret clients must present.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :param source_dir: The source documents directory; defaults to SOURCE_DOCS_PATH.
+    """
+    from backend.app.agents.rabin_karp import SOURCE_DOCS_PATH, SourceIndex
+
+    setup_logging()
+    source_index = SourceIndex(n, window, source_dir or SOURCE_DOCS_PATH, shard=shard, shards=shards)
+    source_index.refresh(force=True)
+    logger.info(f"Shard {shard}/{shards} serving {len(source_index)} fingerprints on {address[0]}:{address[1]}")
+
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                logger.warning(f"Rejected shard connection: {e}")
+                continue
+            threading.Thread(
+                target=_serve_connection, args=(connection, source_index, n, window), daemon=True
+            ).start()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one hash-range shard of the source index.")
+    parser.add_argument('--shard', type=int, required=True, help="Shard number, 0 to shards - 1.")
+    parser.add_argument('--shards', type=int, required=True, help="Total number of shards.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--ngram-size', type=int, default=DEFAULT_NGRAM_SIZE)
+    parser.add_argument('--window', type=int, default=FINGERPRINT_WINDOW)
+    parser.add_argument('--source-dir', default=None)
+    args = parser.parse_args()
+
+    if not SHARD_AUTHKEY:
+        parser.error("SHARD_AUTHKEY must be set")
+    serve_shard((args.host, args.port), args.shard, args.shards, SHARD_AUTHKEY.encode(),
+                args.ngram_size, args.window, args.source_dir)
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,86 @@
-from swarm import Agent, Result
-from typing import List, Dict
-from backend.app.agents.rabin_karp import rabin_karp_plagiarism
-from backend.app.utils.logging_config import logger
+from typing import Iterable, List, Dict, Tuple, Union
+from backend.app.agents.llm_client import LLMClient, function_schema
+from backend.app.agents.rabin_karp import detect_passages
+from backend.app.database.file_reports import format_section_report
+from backend.app.utils.logging_config import debug_sampled, logger
+from backend.app.utils.metrics import stopwatch
 
-def analyze_section_plagiarism(section_text: str, n: int = 5) -> str:
-    logger.info(f"Analyzing section for plagiarism (first 50 chars): {section_text[:50]}...")
-    plagiarism_instances = rabin_karp_plagiarism(section_text, n)
-    logger.info(f"Plagiarism instances found: {len(plagiarism_instances)}")
+def analyze_section(section_text: Union[str, Iterable[str]], n: int = 5) -> Dict:
+    """
+    Finds the plagiarized passages of a section.
 
-    if plagiarism_instances:
-        summary = f"Plagiarism detected in {len(plagiarism_instances)} instances."
-        details = "\n".join([
-            f"Source Document: {instance['source_document']} | "
-            f"Position: {instance['position_in_target']} | "
-            f"N-gram: \"{instance['ngram']}\""
-            for instance in plagiarism_instances
-        ])
-        full_report = f"{summary}\nDetails:\n{details}"
-        logger.info(f"Plagiarism report generated: {summary}")
-    else:
-        full_report = "No plagiarism detected in this section."
-        logger.info("No plagiarism detected in this section.")
+    :param section_text: Section text, or an iterable of its text chunks.
+    :param n: Size of the n-grams.
+    :return: Structured result of detect_passages(): target_words and sources with their passages.
+    """
+    if debug_sampled():
+        if isinstance(section_text, str):
+            logger.debug("Analyzing section for plagiarism (first 50 chars): %s...", section_text[:50])
+        else:
+            logger.debug("Analyzing streamed section for plagiarism")
+    with stopwatch():
+        result = detect_passages(section_text, n)
+    if debug_sampled():
+        sources = result['sources']
+        passage_count = sum(len(source['passages']) for source in sources)
+        logger.debug("Plagiarized passages found: %d from %d sources", passage_count, len(sources))
+    return result
 
-    return full_report
+def analyze_section_plagiarism(section_text: Union[str, Iterable[str]], n: int = 5) -> str:
+    return format_section_report(analyze_section(section_text, n))
 
 def analyze_introduction(text: str) -> str:
+    """Checks the introduction section of a document for plagiarism."""
     logger.info("Analyzing Introduction section")
     return analyze_section_plagiarism(text)
 
 def analyze_body(text: str) -> str:
+    """Checks the body section of a document for plagiarism."""
     logger.info("Analyzing Body section")
     return analyze_section_plagiarism(text)
 
 def analyze_conclusion(text: str) -> str:
+    """Checks the conclusion section of a document for plagiarism."""
     logger.info("Analyzing Conclusion section")
     return analyze_section_plagiarism(text)
 
-# Define Specialized Plagiarism Agents
-introduction_agent = Agent(
-    name="Introduction Plagiarism Agent",
-    instructions="""
+# Instructions of the specialized plagiarism agents
+INTRODUCTION_INSTRUCTIONS = """
         You are an Introduction Plagiarism Agent responsible for analyzing the introduction section of a document.
         Identify any instances of plagiarism by comparing the section text against known source documents.
-    """,
-    functions=[analyze_introduction],
-)
-
-body_agent = Agent(
-    name="Body Plagiarism Agent",
-    instructions="""
+    """
+BODY_INSTRUCTIONS = """
         You are a Body Plagiarism Agent responsible for analyzing the main body of a document.
         Identify any instances of plagiarism by comparing the section text against known source documents.
-    """,
-    functions=[analyze_body],
-)
-
-conclusion_agent = Agent(
-    name="Conclusion Plagiarism Agent",
-    instructions="""
+    """
+CONCLUSION_INSTRUCTIONS = """
         You are a Conclusion Plagiarism Agent responsible for analyzing the conclusion section of a document.
         Identify any instances of plagiarism by comparing the section text against known source documents.
-    """,
-    functions=[analyze_conclusion],
-)
+    """
+
+# Section name to the instructions and tool of its plagiarism agent
+SECTION_AGENTS = {
+    "Introduction": (INTRODUCTION_INSTRUCTIONS, analyze_introduction),
+    "Body": (BODY_INSTRUCTIONS, analyze_body),
+    "Conclusion": (CONCLUSION_INSTRUCTIONS, analyze_conclusion),
+}
+
+async def run_section_agent(section: str, text: str, client: LLMClient) -> List[Tuple[str, str]]:
+    """
+    Lets the plagiarism agent of a section analyze it: one chat completion,
+    then the tool calls it makes.
 
-# Define Triage Agent
-triage_agent = Agent(
-    name="Triage Agent",
-    instructions="""
-    You are a Triage Agent responsible for determining which section of a document to analyze for plagiarism.
-    Based on the content provided, decide whether it's an introduction, body, or conclusion, and then perform the appropriate analysis.
-    Use the available functions to analyze the respective sections in the order: introduction, body, conclusion.
-    """,
-    functions=[
-        analyze_introduction,
-        analyze_body,
-        analyze_conclusion
-    ],
-    model="gpt-4o"
-)
+    :param section: "Introduction", "Body" or "Conclusion".
+    :param text: Section text.
+    :param client: Client to send the request with.
+    :return: (tool name, tool result) per tool call.
+    """
+    instructions, function = SECTION_AGENTS[section]
+    response = await client.complete(
+        messages=[{"role": "system", "content": instructions}, {"role": "user", "content": text}],
+        tools=[function_schema(function)],
+    )
+    message = response.choices[0].message
+    if not message.tool_calls:
+        logger.warning(f"{section} Plagiarism Agent did not call {function.__name__}")
+    return await client.call_tools(message, {function.__name__: function})
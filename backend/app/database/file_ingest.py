@@ -1,54 +1,231 @@
 import os
-import string
-from typing import List, Tuple
+import json
+import time
+import codecs
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+from backend.app.utils.logging_config import logger, setup_logging
+from backend.app.utils.fingerprints import (
+    DEFAULT_NGRAM_SIZE,
+    FINGERPRINT_VERSION,
+    FINGERPRINT_WINDOW,
+    NORMALIZATION,
+    fingerprint_words,
+    iter_words,
+    preprocess_text,
+)
+from backend.app.database.fingerprint_store import (
+    FINGERPRINT_FILE_SUFFIX,
+    INDEX_DIR_NAME,
+    build_segment,
+    fingerprint_file_path,
+    segment_path,
+    write_fingerprint_file,
+)
 
 # Define the path to the source_documents folder
-#SOURCE_DOCS_PATH = os.path.join(os.path.dirname(__file__), '..')
 # source_documents folder is at the same level as the backend folder
+SOURCE_DOCS_PATH = os.getenv('SOURCE_DOCS_PATH', os.path.join(os.path.dirname(__file__), '..', '..','..', 'source_documents'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', os.cpu_count() or 1))
+INGEST_READ_SIZE = int(os.getenv('INGEST_READ_SIZE', 1048576))
+MANIFEST_NAME = "manifest.json"
 
-SOURCE_DOCS_PATH = os.path.join(os.path.dirname(__file__), '..', '..','..', 'source_documents')
-print(SOURCE_DOCS_PATH) 
-
-def preprocess_text(text: str) -> List[str]:
-    translator = str.maketrans('', '', string.punctuation)
-    return text.lower().translate(translator).split()
-
-def generate_ngrams(words: List[str], n: int) -> List[str]:
-    return [" ".join(words[i:i+n]) for i in range(len(words) - n + 1)]
-
-def compute_hash(ngram: str, base: int = 256, mod: int = 10**9 + 7) -> int:
-    """Simple rolling hash function for n-grams."""
-    h = 0
-    for char in ngram:
-        h = (h * base + ord(char)) % mod
-    return h
-
-    # Explain compute_hash
-    # The compute_hash function takes an n-gram and returns a hash value.
-    # It does this by iterating over each character in the n-gram, converting it to its ASCII value, and adding it to the hash value.
-    # How hard it is to break this hash function?
-    # can hash collisions occur in this function?
-    # Answer: It is not a good hash function for large strings. It is easy to break using a dictionary attack.
-    # Answer: Yes, hash collisions can occur in this function.
-
-def ingest_source_document(file_name: str, content: str, n: int = 3):
+def ingest_source_document(file_name: str, content: str, n: int = DEFAULT_NGRAM_SIZE,
+                           window: int = FINGERPRINT_WINDOW):
     """
-    Saves a source document to the source_documents folder and precomputes its n-gram hashes.
+    Saves a new source document to the source_documents folder and precomputes its n-gram hashes and token IDs.
 
     :param file_name: Name of the file to create.
     :param content: Content of the source document.
     :param n: Size of n-grams for hashing.
+    :param window: Winnowing window for fingerprint selection; 1 keeps every n-gram.
     """
     # Save the content to a file
     file_path = os.path.join(SOURCE_DOCS_PATH, file_name)
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write(content)
 
-    # Precompute and save n-gram hashes
-    words = preprocess_text(content)
-    ngrams = generate_ngrams(words, n)
-    with open(file_path + f".ngrams", 'w', encoding='utf-8') as f:
-        for ngram in ngrams:
-            h = compute_hash(ngram)
-            f.write(f"{h}\t{ngram}\n")
+    # Precompute and save n-gram hashes and token IDs in the binary fingerprint format
+    tokens, fingerprints = fingerprint_words(preprocess_text(content), n, window)
+    write_fingerprint_file(fingerprint_file_path(file_path), fingerprints, tokens, n, window)
+
+def _read_text(path: str, digest=None) -> Iterator[str]:
+    # Streams a UTF-8 file as text chunks, feeding its raw bytes to digest if given.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        while data := f.read(INGEST_READ_SIZE):
+            if digest is not None:
+                digest.update(data)
+            yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
+
+def _hash_file(path: str) -> str:
+    # SHA-256 of the raw bytes, without decoding or tokenizing them.
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while data := f.read(INGEST_READ_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+def _ingest_file(path: str, n: int, window: int, known_sha256: Optional[str]) -> Tuple[str, int, int, bool]:
+    """
+    Fingerprints one source document, inside an ingestion worker.
+
+    A document already in the manifest is hashed first and only fingerprinted
+    if its content changed; a new document is hashed and fingerprinted in a
+    single streaming pass.
+
+    :param path: Path to the source document.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :param known_sha256: Content hash recorded in the manifest, if any.
+    :return: (sha256, size, mtime_ns, changed). When the content hash matches
+        ``known_sha256`` the existing fingerprint file is kept and only marked fresh.
+    """
+    stat = os.stat(path)
+    fp_path = fingerprint_file_path(path)
+    if known_sha256 is not None and os.path.exists(fp_path):
+        sha256 = _hash_file(path)
+        if sha256 == known_sha256:
+            os.utime(fp_path)
+            return sha256, stat.st_size, stat.st_mtime_ns, False
+        tokens, fingerprints = fingerprint_words(iter_words(_read_text(path)), n, window)
+    else:
+        digest = hashlib.sha256()
+        tokens, fingerprints = fingerprint_words(iter_words(_read_text(path, digest)), n, window)
+        sha256 = digest.hexdigest()
+    write_fingerprint_file(fp_path, fingerprints, tokens, n, window)
+    return sha256, stat.st_size, stat.st_mtime_ns, True
+
+def _ingest_task(args: Tuple[str, int, int, Optional[str]]) -> Tuple[str, Optional[Tuple[str, int, int, bool]], Optional[str]]:
+    path = args[0]
+    try:
+        return path, _ingest_file(*args), None
+    except (OSError, UnicodeDecodeError) as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+def _manifest_path(source_dir: str) -> str:
+    return os.path.join(source_dir, INDEX_DIR_NAME, MANIFEST_NAME)
+
+def load_manifest(source_dir: str, n: int, window: int) -> Dict[str, Dict]:
+    """
+    Loads the ingestion manifest of a source directory.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams the caller ingests with.
+    :param window: Winnowing window the caller ingests with.
+    :return: File name to {"sha256", "size", "mtime_ns"}; empty if the manifest
+        is missing or was written with other fingerprint settings.
+    """
+    try:
+        with open(_manifest_path(source_dir), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable ingestion manifest: {e}")
+        return {}
+    if (manifest.get('version'), manifest.get('n'), manifest.get('window'), manifest.get('normalization')) != \
+            (FINGERPRINT_VERSION, n, window, NORMALIZATION):
+        logger.info("Ingestion manifest was written with other fingerprint settings; re-ingesting everything")
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(source_dir: str, n: int, window: int, files: Dict[str, Dict]):
+    """
+    Atomically writes the ingestion manifest of a source directory.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :param files: File name to {"sha256", "size", "mtime_ns"}.
+    """
+    path = _manifest_path(source_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': FINGERPRINT_VERSION, 'n': n, 'window': window,
+                   'normalization': NORMALIZATION, 'files': files}, f)
+    os.replace(tmp_path, path)
+
+def ingest_corpus(source_dir: str = SOURCE_DOCS_PATH, n: int = DEFAULT_NGRAM_SIZE, window: int = FINGERPRINT_WINDOW,
+                  workers: int = INGEST_WORKERS, rebuild_segment: bool = True) -> Dict:
+    """
+    Incrementally fingerprints every .txt document of a source directory.
+
+    Files whose size and modification time match the manifest are skipped
+    without being read. The rest go through a process pool: a known file
+    whose content hash is unchanged is only hashed and keeps its fingerprint
+    file, other files are fingerprinted. Fingerprint files of
+    deleted documents are removed. Finally the corpus segment is rebuilt so
+    the API starts without indexing.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :param workers: Number of ingestion processes.
+    :param rebuild_segment: Rebuild the corpus segment afterwards.
+    :return: Statistics: scanned, ingested, unchanged, skipped, deleted and
+        failed document counts, bytes read, seconds, docs_per_second and mb_per_second.
+    """
+    started = time.monotonic()
+    manifest = load_manifest(source_dir, n, window)
+
+    current = {}
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.txt') and entry.is_file():
+                stat = entry.stat()
+                current[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+    stats = {'scanned': len(current), 'ingested': 0, 'unchanged': 0, 'skipped': 0, 'deleted': 0, 'failed': 0,
+             'bytes': 0}
+
+    for file_name in [name for name in manifest if name not in current]:
+        del manifest[file_name]
+        stats['deleted'] += 1
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(FINGERPRINT_FILE_SUFFIX) and entry.name[:-len(FINGERPRINT_FILE_SUFFIX)] not in current:
+                os.remove(entry.path)
+
+    tasks = []
+    for file_name, (mtime_ns, size) in current.items():
+        known = manifest.get(file_name)
+        fresh = (known is not None and known['mtime_ns'] == mtime_ns and known['size'] == size
+                 and os.path.exists(fingerprint_file_path(os.path.join(source_dir, file_name))))
+        if fresh:
+            stats['skipped'] += 1
+        else:
+            tasks.append((os.path.join(source_dir, file_name), n, window, known['sha256'] if known else None))
+
+    if tasks:
+        logger.info(f"Ingesting {len(tasks)} of {len(current)} source documents with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_logging) as executor:
+            for path, result, error in executor.map(_ingest_task, tasks, chunksize=max(1, len(tasks) // (workers * 16))):
+                file_name = os.path.basename(path)
+                if error is not None:
+                    logger.error(f"Failed to ingest source document {file_name}: {error}")
+                    manifest.pop(file_name, None)
+                    stats['failed'] += 1
+                    continue
+                sha256, size, mtime_ns, changed = result
+                manifest[file_name] = {'sha256': sha256, 'size': size, 'mtime_ns': mtime_ns}
+                stats['ingested' if changed else 'unchanged'] += 1
+                stats['bytes'] += size
+
+    save_manifest(source_dir, n, window, manifest)
+    if rebuild_segment and (tasks or stats['deleted'] or not os.path.exists(segment_path(source_dir, n, window))):
+        build_segment(source_dir, n, {name: current[name] for name in manifest}, window)
 
+    stats['seconds'] = time.monotonic() - started
+    processed = stats['ingested'] + stats['unchanged']
+    stats['docs_per_second'] = processed / stats['seconds'] if stats['seconds'] else 0.0
+    stats['mb_per_second'] = stats['bytes'] / 1048576 / stats['seconds'] if stats['seconds'] else 0.0
+    logger.info(
+        f"Ingestion finished in {stats['seconds']:.2f}s: {stats['ingested']} ingested, {stats['unchanged']} unchanged, "
+        f"{stats['skipped']} skipped, {stats['deleted']} deleted, {stats['failed']} failed "
+        f"({stats['docs_per_second']:.1f} docs/s, {stats['mb_per_second']:.2f} MB/s)"
+    )
+    return stats
@@ -1,7 +1,246 @@
 import os
+import gzip
+import json
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from backend.app.utils.logging_config import logger
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+# Report storage.
+#
+# Reports are stored as structured JSON, one file per document, optionally
+# compressed, in directories sharded by the first two characters of the
+# document ID so no directory grows without bound:
+#
+#   reports/<id[:2]>/<id>.json[.gz|.zst]   structured report
+#   reports/targets/<id[:2]>/<id>.txt      uploaded target document
+#
+# Target documents are only needed until their report is written and are
+# removed TARGET_TTL seconds after upload by cleanup_expired(); reports can
+# expire too (REPORT_TTL). Reports and targets of the old flat layout
+# (reports/<id>_report.txt, reports/<id>_target.txt) are still read but never
+# cleaned up.
 
 # Define the path to the reports folder
-REPORTS_PATH = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'reports')
+REPORTS_PATH = os.getenv('REPORTS_PATH', os.path.join(os.path.dirname(__file__), '..', '..', '..', 'reports'))
+REPORT_COMPRESSION = os.getenv('REPORT_COMPRESSION', 'gzip')  # gzip, zstd or none
+TARGET_TTL = float(os.getenv('TARGET_TTL', 7 * 24 * 3600))  # seconds; 0 keeps targets forever
+REPORT_TTL = float(os.getenv('REPORT_TTL', 0))  # seconds; 0 keeps reports forever
+REPORT_PAGE_SIZE = int(os.getenv('REPORT_PAGE_SIZE', 100))
+REPORT_FORMAT_VERSION = 1
+
+TARGETS_DIR_NAME = "targets"
+_EXTENSIONS = {'gzip': '.json.gz', 'zstd': '.json.zst', 'none': '.json'}
+
+def _shard_dir(root: str, document_id: str) -> str:
+    return os.path.join(root, document_id[:2])
+
+def target_path(document_id: str) -> str:
+    """
+    Returns the path an uploaded target document is stored at, creating its directory.
+
+    :param document_id: Identifier of the document.
+    :return: Path of the target file.
+    """
+    directory = _shard_dir(os.path.join(REPORTS_PATH, TARGETS_DIR_NAME), document_id)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{document_id}.txt")
+
+def find_target(document_id: str) -> str:
+    """
+    Locates the target document of a job, falling back to the old flat layout.
+
+    :param document_id: Identifier of the document.
+    :return: Path of the target file; the sharded path if neither exists.
+    """
+    path = os.path.join(_shard_dir(os.path.join(REPORTS_PATH, TARGETS_DIR_NAME), document_id), f"{document_id}.txt")
+    legacy_path = os.path.join(REPORTS_PATH, f"{document_id}_target.txt")
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        return legacy_path
+    return path
+
+def report_path(document_id: str, compression: str = REPORT_COMPRESSION) -> str:
+    """
+    Returns the path a report is stored at with the given compression.
+
+    :param document_id: Identifier of the document.
+    :param compression: "gzip", "zstd" or "none".
+    :return: Path of the report file.
+    """
+    if compression not in _EXTENSIONS:
+        raise ValueError(f"Unknown report compression: {compression}. Available: {', '.join(_EXTENSIONS)}")
+    return os.path.join(_shard_dir(REPORTS_PATH, document_id), document_id + _EXTENSIONS[compression])
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("REPORT_COMPRESSION=zstd requires the zstandard package")
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("Reading zstd reports requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+def save_report(document_id: str, report: Dict, compression: str = REPORT_COMPRESSION) -> str:
+    """
+    Atomically writes a structured report.
+
+    :param document_id: Identifier of the document.
+    :param report: Report with "sections" (see render_report()) and/or "text".
+    :param compression: "gzip", "zstd" or "none".
+    :return: Path of the written report.
+    """
+    path = report_path(document_id, compression)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = dict(report, version=REPORT_FORMAT_VERSION, document_id=document_id,
+                   created_at=report.get('created_at', time.time()))
+    data = _compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compression)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    # Drop copies written before REPORT_COMPRESSION changed, so reads see this one
+    for other in _EXTENSIONS:
+        if other != compression and os.path.exists(report_path(document_id, other)):
+            os.remove(report_path(document_id, other))
+    return path
+
+def find_report(document_id: str) -> Optional[str]:
+    """
+    Locates the stored report of a document.
+
+    :param document_id: Identifier of the document.
+    :return: Path of the report file, in whichever compression or layout it
+        was written, or None if there is no report.
+    """
+    for compression in _EXTENSIONS:
+        path = report_path(document_id, compression)
+        if os.path.exists(path):
+            return path
+    legacy_path = os.path.join(REPORTS_PATH, f"{document_id}_report.txt")
+    return legacy_path if os.path.exists(legacy_path) else None
+
+def read_report(path: str) -> Dict:
+    """
+    Reads a report file found by find_report().
+
+    :param path: Path of the report file.
+    :return: The structured report, or a {"text": ...} report for reports of the old flat layout.
+    """
+    if path.endswith('_report.txt'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return {'document_id': os.path.basename(path)[:-len('_report.txt')], 'sections': [], 'text': f.read()}
+    compression = next(name for name, extension in _EXTENSIONS.items() if path.endswith(extension))
+    with open(path, 'rb') as f:
+        return json.loads(_decompress(f.read(), compression))
+
+def load_report(document_id: str) -> Optional[Dict]:
+    """
+    Reads the report of a document, whatever compression it was stored with.
+
+    :param document_id: Identifier of the document.
+    :return: The structured report, a {"text": ...} report for reports of the
+        old flat layout, or None if there is no report.
+    """
+    path = find_report(document_id)
+    if path is None:
+        return None
+    try:
+        return read_report(path)
+    except FileNotFoundError:  # removed by cleanup_expired() in the meantime
+        return None
+
+def format_section_report(result: Dict) -> str:
+    """
+    Formats the passages found in one section as plain text.
+
+    :param result: Section result with "sources", as returned by detect_passages().
+    :return: Human-readable section report.
+    """
+    sources = result['sources']
+    if not sources:
+        return "No plagiarism detected in this section."
+
+    passage_count = sum(len(source['passages']) for source in sources)
+    summary = f"Plagiarism detected in {passage_count} passages from {len(sources)} sources."
+    details = "\n".join(
+        f"Source Document: {source['source_document']} | "
+        f"Coverage: {source['coverage']:.1f}% | "
+        f"Passages: {len(source['passages'])}\n"
+        + "\n".join(
+            f"  Target words {passage['target_start']}-{passage['target_end']} | "
+            f"Source words {passage['source_start']}-{passage['source_end']} | "
+            f"Length: {passage['length']} words | "
+            f"\"{passage['excerpt']}{' ...' if passage['length'] > len(passage['excerpt'].split()) else ''}\""
+            for passage in source['passages']
+        )
+        for source in sources
+    )
+    return f"{summary}\nDetails:\n{details}"
+
+def render_report(report: Dict) -> str:
+    """
+    Renders a report as the plain text served by /report.
+
+    :param report: Structured report; each section has "name", "analyzer" and "sources".
+    :return: The text report.
+    """
+    if not report.get('sections'):
+        return report.get('text', "")
+    return "".join(
+        f"{section['analyzer']} result:\n{format_section_report(section)}\n\n"
+        for section in report['sections']
+    )
+
+def report_matches(report: Dict, section: Optional[str] = None, target_start: Optional[int] = None,
+                   target_end: Optional[int] = None, offset: int = 0, limit: int = REPORT_PAGE_SIZE) -> Dict:
+    """
+    Returns one page of the passages of a report, optionally restricted to a
+    section and to the passages overlapping a range of target words.
+
+    :param report: Structured report.
+    :param section: Only return passages of this section.
+    :param target_start: Only return passages ending after this target word.
+    :param target_end: Only return passages starting before this target word.
+    :param offset: Number of matching passages to skip.
+    :param limit: Maximum number of passages to return.
+    :return: Dict with the total number of matching passages, offset, limit and
+        the page of matches, ordered by section and target position.
+    """
+    matches: List[Dict] = []
+    for report_section in report.get('sections', ()):
+        if section is not None and report_section['name'] != section:
+            continue
+        passages = sorted(
+            (dict(passage, section=report_section['name'], source_document=source['source_document'])
+             for source in report_section['sources'] for passage in source['passages']),
+            key=lambda passage: passage['target_start'],
+        )
+        if target_end is not None:
+            passages = passages[:bisect_left([p['target_start'] for p in passages], target_end)]
+        if target_start is not None:
+            passages = [passage for passage in passages if passage['target_end'] > target_start]
+        matches.extend(passages)
+    return {
+        'total': len(matches),
+        'offset': offset,
+        'limit': limit,
+        'matches': matches[offset:offset + limit],
+    }
 
 def get_report(document_id: str) -> str:
     """
@@ -10,8 +249,43 @@ def get_report(document_id: str) -> str:
     :param document_id: Identifier of the document.
     :return: Content of the report.
     """
-    report_file = os.path.join(REPORTS_PATH, f"{document_id}_report.txt")
-    if not os.path.exists(report_file):
+    report = load_report(document_id)
+    if report is None:
         return "Report not available yet."
-    with open(report_file, 'r', encoding='utf-8') as f:
-        return f.read()
+    return render_report(report)
+
+def _remove_expired(root: str, ttl: float, now: float) -> int:
+    removed = 0
+    if ttl <= 0 or not os.path.isdir(root):
+        return removed
+    with os.scandir(root) as shards:
+        for shard in shards:
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and now - entry.stat().st_mtime > ttl:
+                            os.remove(entry.path)
+                            removed += 1
+                    except OSError as e:
+                        logger.warning(f"Failed to remove expired file {entry.path}: {e}")
+    return removed
+
+def cleanup_expired(now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Removes target documents older than TARGET_TTL and reports older than REPORT_TTL.
+
+    Only the sharded layout is cleaned up; files of the old flat layout are left alone.
+
+    :param now: Current time, for tests.
+    :return: Number of removed targets and reports.
+    """
+    now = time.time() if now is None else now
+    removed = {
+        'targets': _remove_expired(os.path.join(REPORTS_PATH, TARGETS_DIR_NAME), TARGET_TTL, now),
+        'reports': _remove_expired(REPORTS_PATH, REPORT_TTL, now),
+    }
+    if removed['targets'] or removed['reports']:
+        logger.info(f"Removed {removed['targets']} expired targets and {removed['reports']} expired reports")
+    return removed
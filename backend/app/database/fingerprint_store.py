@@ -0,0 +1,354 @@
+import os
+import json
+import mmap
+import struct
+import tempfile
+import shutil
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from backend.app.utils.logging_config import logger
+from backend.app.utils.fingerprints import (
+    FINGERPRINT_VERSION,
+    FINGERPRINT_WINDOW,
+    NORMALIZATION,
+    fingerprint_words,
+    preprocess_text,
+    shard_bounds,
+)
+
+# Binary storage engine for source fingerprints.
+#
+# Each source document gets a small per-document file (<file>.fp) holding its
+# hashes and positions in document order, followed by its token IDs (one
+# token hash per word). The per-document files are merged into one corpus
+# segment per n-gram size and winnowing window (.index/n<N>[-w<W>].seg), or
+# into one segment per hash-range shard (.index/n<N>[-w<W>]-s<I>of<S>.seg)
+# when the index is split across processes or nodes (see agents/shards.py).
+# Segments are laid out as:
+#
+#   header | metadata (JSON: normalization, document table) | hashes | postings
+#          | token offsets | tokens
+#
+# ``hashes`` is a sorted uint64 array and ``postings`` a parallel uint64 array
+# of (doc_id << 32 | position). ``tokens`` holds the token IDs of every
+# document back to back, document doc_id spanning token offsets doc_id to
+# doc_id + 1; shard segments hold the tokens of all documents, since their
+# hits can point into any of them. The segment is memory-mapped read-only, so
+# lookups are a binary search into the page cache, hits are verified against
+# the mapped tokens, and every worker process shares the same physical copy.
+
+FINGERPRINT_FILE_SUFFIX = ".fp"
+INDEX_DIR_NAME = ".index"
+
+_DOC_MAGIC = b"PLAGFP\x00\x00"
+_SEGMENT_MAGIC = b"PLAGSEG\x00"
+_DOC_HEADER = struct.Struct('<8sIII16sQQ')     # magic, version, n, window, normalization, count, token_count
+_SEGMENT_HEADER = struct.Struct('<8sIIIQQQQ')  # magic, version, n, window, posting_count, meta_length, hashes_offset, token_count
+# The document header has room for 16 bytes of the normalization name.
+_NORMALIZATION_TAG = NORMALIZATION.encode()[:16]
+
+def _aligned(offset: int, alignment: int = 8) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+def fingerprint_file_path(source_path: str) -> str:
+    """
+    Returns the path of the binary fingerprint file stored next to a source document.
+
+    :param source_path: Path to the source document.
+    :return: Path to its fingerprint file.
+    """
+    return source_path + FINGERPRINT_FILE_SUFFIX
+
+def segment_path(source_dir: str, n: int, window: int = FINGERPRINT_WINDOW, shard: int = 0, shards: int = 1) -> str:
+    """
+    Returns the path of the corpus segment for n-grams of size n.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window the segment was built with.
+    :param shard: Hash-range shard held by the segment.
+    :param shards: Number of shards the hash space is split into; 1 for a full segment.
+    :return: Path to the segment file.
+    """
+    name = f"n{n}" if window <= 1 else f"n{n}-w{window}"
+    if shards > 1:
+        name += f"-s{shard}of{shards}"
+    return os.path.join(source_dir, INDEX_DIR_NAME, name + ".seg")
+
+def write_fingerprint_file(path: str, fingerprints: List[Tuple[int, int]], tokens: array, n: int,
+                           window: int = FINGERPRINT_WINDOW):
+    """
+    Writes the fingerprints and token IDs of one document as a binary fingerprint file.
+
+    :param path: Destination file.
+    :param fingerprints: List of (hash, position) tuples.
+    :param tokens: uint64 array of the document's token IDs, see fingerprint_words().
+    :param n: Size of the n-grams the fingerprints were computed with.
+    :param window: Winnowing window the fingerprints were selected with.
+    """
+    hashes = array('Q', (h for h, _ in fingerprints))
+    positions = array('I', (position for _, position in fingerprints))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_DOC_HEADER.pack(_DOC_MAGIC, FINGERPRINT_VERSION, n, window, _NORMALIZATION_TAG,
+                                 len(hashes), len(tokens)))
+        hashes.tofile(f)
+        positions.tofile(f)
+        tokens.tofile(f)
+    os.replace(tmp_path, path)
+
+def read_fingerprint_file(path: str, n: int, window: int = FINGERPRINT_WINDOW) -> Optional[Tuple[array, array, array]]:
+    """
+    Reads a binary fingerprint file if it matches the current format, n-gram size and window.
+
+    :param path: Fingerprint file to read.
+    :param n: Expected n-gram size.
+    :param window: Expected winnowing window.
+    :return: (hashes, positions, tokens) arrays, or None if the file is missing or incompatible.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_DOC_HEADER.size)
+            if len(header) != _DOC_HEADER.size:
+                return None
+            magic, version, file_n, file_window, normalization, count, token_count = _DOC_HEADER.unpack(header)
+            if (magic != _DOC_MAGIC or version != FINGERPRINT_VERSION or file_n != n or file_window != window
+                    or normalization.rstrip(b'\x00') != _NORMALIZATION_TAG):
+                logger.debug(f"Ignoring incompatible fingerprint file: {path}")
+                return None
+            hashes = array('Q')
+            hashes.fromfile(f, count)
+            positions = array('I')
+            positions.fromfile(f, count)
+            tokens = array('Q')
+            tokens.fromfile(f, token_count)
+            return hashes, positions, tokens
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, struct.error) as e:
+        logger.warning(f"Failed to read fingerprint file {path}: {e}")
+        return None
+
+def load_or_compute_fingerprint_arrays(source_path: str, n: int,
+                                       window: int = FINGERPRINT_WINDOW) -> Tuple[array, array, array]:
+    """
+    Loads the precomputed fingerprints and token IDs of a source document,
+    falling back to tokenizing it when the fingerprint file is missing, stale
+    or incompatible.
+
+    :param source_path: Path to the source document.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :return: (hashes, positions, tokens) arrays in document order.
+    """
+    fp_path = fingerprint_file_path(source_path)
+    try:
+        fresh = os.path.getmtime(fp_path) >= os.path.getmtime(source_path)
+    except OSError:
+        fresh = False
+
+    if fresh:
+        stored = read_fingerprint_file(fp_path, n, window)
+        if stored is not None:
+            return stored
+
+    with open(source_path, 'r', encoding='utf-8') as f:
+        tokens, fingerprints = fingerprint_words(preprocess_text(f.read()), n, window)
+    return array('Q', (h for h, _ in fingerprints)), array('I', (position for _, position in fingerprints)), tokens
+
+def build_segment(source_dir: str, n: int, signatures: Dict[str, Tuple[int, int]],
+                  window: int = FINGERPRINT_WINDOW, shard: int = 0, shards: int = 1) -> str:
+    """
+    Merges the fingerprints and token IDs of the given source documents into a corpus segment.
+
+    The segment is written to a temporary file and atomically renamed into
+    place, so readers either see the old segment or the complete new one.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams.
+    :param signatures: Mapping of file name to its (mtime_ns, size) signature.
+    :param window: Winnowing window.
+    :param shard: Hash-range shard to keep.
+    :param shards: Number of shards; 1 keeps every fingerprint.
+    :return: Path to the written segment.
+    """
+    # Documents that fail to fingerprint are left out of the segment, so the
+    # index sees them as new and retries them on its next refresh.
+    path = segment_path(source_dir, n, window, shard, shards)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    docs = []
+    hash_parts, posting_parts = [], []
+    token_offsets = array('Q', [0])
+    # Token IDs are spooled to disk while the postings are collected, so only
+    # the fingerprints are held in memory
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as token_file:
+        for filename in sorted(signatures):
+            try:
+                doc_hashes, positions, tokens = load_or_compute_fingerprint_arrays(
+                    os.path.join(source_dir, filename), n, window)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to fingerprint source document {filename}: {e}")
+                continue
+            doc_id = len(docs)
+            docs.append(filename)
+            hash_parts.append(np.frombuffer(doc_hashes, dtype=np.uint64))
+            posting_parts.append((np.uint64(doc_id) << np.uint64(32)) | np.frombuffer(positions, dtype=np.uint32).astype(np.uint64))
+            tokens.tofile(token_file)
+            token_offsets.append(token_offsets[-1] + len(tokens))
+
+        hashes = np.concatenate(hash_parts) if hash_parts else np.zeros(0, dtype=np.uint64)
+        postings = np.concatenate(posting_parts) if posting_parts else np.zeros(0, dtype=np.uint64)
+        del hash_parts, posting_parts
+        if shards > 1:
+            selected = np.searchsorted(np.array(shard_bounds(shards), dtype=np.uint64), hashes, side='right') == shard
+            hashes, postings = hashes[selected], postings[selected]
+        order = np.lexsort((postings, hashes))
+        hashes, postings = hashes[order], postings[order]
+        del order
+
+        meta = json.dumps({
+            'normalization': NORMALIZATION,
+            'shard': [shard, shards],
+            'docs': [[filename, *signatures[filename]] for filename in docs],
+        }).encode('utf-8')
+        hashes_offset = _aligned(_SEGMENT_HEADER.size + len(meta))
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, FINGERPRINT_VERSION, n, window, len(hashes), len(meta),
+                                         hashes_offset, token_offsets[-1]))
+            f.write(meta)
+            f.write(b'\x00' * (hashes_offset - _SEGMENT_HEADER.size - len(meta)))
+            hashes.tofile(f)
+            postings.tofile(f)
+            token_offsets.tofile(f)
+            token_file.seek(0)
+            shutil.copyfileobj(token_file, f, 1 << 20)
+    os.replace(tmp_path, path)
+    logger.info(f"Built fingerprint segment {path}: {len(docs)} documents, {len(hashes)} fingerprints.")
+    return path
+
+class FingerprintSegment:
+    """
+    Read-only, memory-mapped view of a corpus segment.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n, window, count, meta_length, hashes_offset, token_count = \
+            _SEGMENT_HEADER.unpack_from(self._mmap, 0)
+        if magic != _SEGMENT_MAGIC or version != FINGERPRINT_VERSION:
+            raise ValueError(f"Incompatible fingerprint segment: {path}")
+        meta = json.loads(self._mmap[_SEGMENT_HEADER.size:_SEGMENT_HEADER.size + meta_length])
+        if meta['normalization'] != NORMALIZATION:
+            raise ValueError(f"Fingerprint segment {path} uses normalization {meta['normalization']}")
+
+        self.n = n
+        self.window = window
+        self.shard, self.shards = meta.get('shard', [0, 1])
+        self.docs: List[str] = [doc[0] for doc in meta['docs']]
+        self.doc_names = np.array(self.docs, dtype=object)
+        self.doc_ids: Dict[str, int] = {filename: doc_id for doc_id, filename in enumerate(self.docs)}
+        self.signatures: Dict[str, Tuple[int, int]] = {doc[0]: (doc[1], doc[2]) for doc in meta['docs']}
+        view = memoryview(self._mmap)
+        postings_offset = hashes_offset + 8 * count
+        token_offsets_offset = postings_offset + 8 * count
+        tokens_offset = token_offsets_offset + 8 * (len(self.docs) + 1)
+        if len(self._mmap) != tokens_offset + 8 * token_count:
+            raise ValueError(f"Truncated fingerprint segment: {path}")
+        self.hashes = view[hashes_offset:postings_offset].cast('Q')
+        self._postings = view[postings_offset:token_offsets_offset].cast('Q')
+        self._token_offsets = view[token_offsets_offset:tokens_offset].cast('Q')
+        self._tokens = view[tokens_offset:].cast('Q')
+        self._hash_array = np.frombuffer(self._mmap, dtype=np.uint64, count=count, offset=hashes_offset)
+        self._posting_array = np.frombuffer(self._mmap, dtype=np.uint64, count=count, offset=postings_offset)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def is_current(self) -> bool:
+        """
+        Checks whether the segment file on disk is still the one mapped.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def tokens(self, doc_id: int) -> memoryview:
+        """
+        Returns the token IDs of a document, without copying them out of the mapping.
+
+        :param doc_id: Index of the document in ``docs``.
+        :return: uint64 memoryview with one token ID per word.
+        """
+        return self._tokens[self._token_offsets[doc_id]:self._token_offsets[doc_id + 1]]
+
+    def lookup(self, h: int) -> List[Tuple[int, int]]:
+        """
+        Returns the (doc_id, position) postings stored for a hash.
+
+        :param h: Hash value of an n-gram.
+        :return: List of (doc_id, position) tuples, empty if unknown.
+        """
+        lo = bisect_left(self.hashes, h)
+        if lo == len(self.hashes) or self.hashes[lo] != h:
+            return []
+        hi = bisect_right(self.hashes, h, lo)
+        return [(posting >> 32, posting & 0xFFFFFFFF) for posting in self._postings[lo:hi]]
+
+    def lookup_many(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized lookup(): fetches the postings of many hashes in one pass over the segment arrays.
+
+        :param hashes: uint64 array of n-gram hashes.
+        :return: (index into ``hashes``, doc_id, position) arrays with one entry
+            per posting, ordered by hash index.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(self._hash_array) or not len(hashes):
+            return empty, empty, empty
+        # Searching in sorted order walks the segment front to back, which
+        # keeps the binary searches cache friendly
+        order = np.argsort(hashes)
+        lo = np.empty(len(hashes), dtype=np.int64)
+        lo[order] = np.searchsorted(self._hash_array, hashes[order], side='left')
+        which = np.flatnonzero(self._hash_array[np.minimum(lo, len(self._hash_array) - 1)] == hashes)
+        if not len(which):
+            return empty, empty, empty
+        lo = lo[which]
+        counts = np.searchsorted(self._hash_array, hashes[which], side='right') - lo
+        ends = np.cumsum(counts)
+        which = np.repeat(which, counts)
+        slots = np.arange(int(ends[-1])) + np.repeat(lo - (ends - counts), counts)
+        postings = self._posting_array[slots]
+        return which, (postings >> np.uint64(32)).astype(np.int64), (postings & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+def open_segment(source_dir: str, n: int, window: int = FINGERPRINT_WINDOW,
+                 shard: int = 0, shards: int = 1) -> Optional[FingerprintSegment]:
+    """
+    Opens the corpus segment for n-grams of size n if it exists and is compatible.
+
+    :param source_dir: The source documents directory.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window.
+    :param shard: Hash-range shard.
+    :param shards: Number of shards; 1 for the full segment.
+    :return: The mapped segment, or None.
+    """
+    path = segment_path(source_dir, n, window, shard, shards)
+    try:
+        return FingerprintSegment(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.warning(f"Ignoring unusable fingerprint segment {path}: {e}")
+        return None
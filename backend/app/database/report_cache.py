@@ -0,0 +1,156 @@
+import os
+import gzip
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from backend.app.database.file_reports import REPORT_TTL, find_report, read_report, render_report
+from backend.app.utils.metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # br response compression is optional
+    brotli = None
+
+REPORT_CACHE_BYTES = int(os.getenv('REPORT_CACHE_BYTES', 67108864))  # Default to 64MB
+# Bodies smaller than this are sent uncompressed
+REPORT_COMPRESS_MIN_SIZE = int(os.getenv('REPORT_COMPRESS_MIN_SIZE', 1024))
+
+def _encode(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+def available_encodings(size: int) -> tuple:
+    """
+    Returns the content encodings worth offering for a body, most preferred first.
+
+    :param size: Size of the uncompressed body in bytes.
+    """
+    if size < REPORT_COMPRESS_MIN_SIZE:
+        return ()
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+class ReportCache:
+    """
+    Bounded LRU of rendered reports, keyed by document ID.
+
+    A completed report is never rewritten, so an entry stays valid until it
+    is evicted or its REPORT_TTL runs out; hits touch neither the report nor
+    its directory. Each entry holds the rendered text with its validators
+    (ETag and modification time) and the compressed variants of the text
+    produced so far, and all of them count towards ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def _entry_size(entry: Dict) -> int:
+        return sum(len(body) for body in entry['bodies'].values())
+
+    def _store(self, document_id: str, entry: Dict):
+        old = self._entries.pop(document_id, None)
+        if old is not None:
+            self._size -= self._entry_size(old)
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        self._entries[document_id] = entry
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= self._entry_size(evicted)
+
+    def cached(self, document_id: str) -> Optional[Dict]:
+        """
+        Returns the cached rendered report of a document without touching disk.
+
+        :param document_id: Identifier of the document.
+        :return: The entry, see load(), or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is not None and entry['expires'] is not None and entry['expires'] <= now:
+                self._size -= self._entry_size(self._entries.pop(document_id))
+                entry = None
+            if entry is None:
+                CACHE_REQUESTS.inc('report', 'miss')
+                return None
+            self._entries.move_to_end(document_id)
+        CACHE_REQUESTS.inc('report', 'hit')
+        return entry
+
+    def load(self, document_id: str) -> Optional[Dict]:
+        """
+        Reads and renders the report of a document and caches it.
+
+        :param document_id: Identifier of the document.
+        :return: Dict with "etag", "last_modified" (seconds since the epoch),
+            "expires" and "bodies" (encoding to body; "identity" is the UTF-8
+            text), or None if the report does not exist.
+        """
+        path = find_report(document_id)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+            text = render_report(read_report(path))
+        except FileNotFoundError:  # removed by cleanup_expired() in the meantime
+            return None
+        entry = {
+            'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            'last_modified': stat.st_mtime,
+            'expires': stat.st_mtime + REPORT_TTL if REPORT_TTL > 0 else None,
+            'bodies': {'identity': text.encode('utf-8')},
+        }
+        with self._lock:
+            self._store(document_id, entry)
+        return entry
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        """
+        Returns the rendered report of a document, reading it on a cache miss.
+
+        :param document_id: Identifier of the document.
+        :return: The entry, see load(), or None if the report does not exist.
+        """
+        entry = self.cached(document_id)
+        return entry if entry is not None else self.load(document_id)
+
+    def body(self, document_id: str, entry: Dict, encoding: str) -> bytes:
+        """
+        Returns the report body in a content encoding, compressing it once and caching the result.
+
+        :param document_id: Identifier of the document.
+        :param entry: Entry returned by get().
+        :param encoding: "identity", "gzip" or "br".
+        :return: The encoded body.
+        """
+        body = entry['bodies'].get(encoding)
+        if body is None:
+            body = _encode(entry['bodies']['identity'], encoding)
+            with self._lock:
+                if self._entries.get(document_id) is entry:
+                    entry = dict(entry, bodies=dict(entry['bodies'], **{encoding: body}))
+                    self._store(document_id, entry)
+        return body
+
+    def stats(self) -> Tuple[int, int]:
+        """
+        Returns the number of cached reports and the bytes they take.
+        """
+        with self._lock:
+            return len(self._entries), self._size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,216 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from backend.app.database.file_reports import load_report, save_report
+from backend.app.utils.logging_config import logger
+from backend.app.utils.metrics import CACHE_REQUESTS
+
+# Content-addressed memo of finished reports.
+#
+# A job's key is a hash of its normalized section texts and of everything
+# else the report depends on: processing mode, detection parameters and the
+# corpus version, a hash of the name, size and modification time of every
+# source document. The cache maps keys to the document whose report holds
+# the result, so a resubmitted document is answered by copying that report.
+# Corpus versions start with the newest modification time of the corpus so
+# they order by age. The newest version seen by any process is stored next
+# to the results: keys of older versions are purged as soon as it changes,
+# and results computed against an older version are not stored at all. The
+# cache lives in SQLite, shared by the API and the workers, and keeps the
+# RESULT_CACHE_SIZE most recently used keys.
+
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(os.path.dirname(__file__), '..', '..', '..', 'results.db'))
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 10000))  # 0 disables the cache
+CORPUS_VERSION_INTERVAL = float(os.getenv('CORPUS_VERSION_INTERVAL', 5))
+
+_corpus_versions: Dict[str, Tuple[float, str]] = {}
+_corpus_lock = threading.Lock()
+
+def corpus_version(source_dir: str, max_age: float = CORPUS_VERSION_INTERVAL) -> str:
+    """
+    Returns a hash identifying the current state of a source corpus.
+
+    The directory is rescanned at most once per ``max_age`` seconds.
+
+    :param source_dir: The source documents directory.
+    :param max_age: Seconds a computed version is reused for.
+    :return: Newest modification time of the corpus in nanoseconds, zero-padded so
+        versions compare in age order, followed by a hex digest over the name, size
+        and modification time of every source document.
+    """
+    now = time.monotonic()
+    with _corpus_lock:
+        cached = _corpus_versions.get(source_dir)
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
+        signatures = []
+        # Adding or removing a document changes the directory's mtime
+        stamp = os.stat(source_dir).st_mtime_ns
+        with os.scandir(source_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.txt') and entry.is_file():
+                    stat = entry.stat()
+                    signatures.append(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}")
+                    stamp = max(stamp, stat.st_mtime_ns)
+        digest = hashlib.blake2b(digest_size=16)
+        for signature in sorted(signatures):
+            digest.update(signature.encode('utf-8', errors='surrogateescape'))
+            digest.update(b'\n')
+        version = f"{stamp:020d}-{digest.hexdigest()}"
+        _corpus_versions[source_dir] = (now, version)
+        return version
+
+class ResultCache:
+    """
+    Bounded LRU from result keys to the document whose report holds the result.
+    """
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_entries: int = RESULT_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                corpus_version TEXT NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                version TEXT NOT NULL
+            )
+        """)
+
+    def _advance(self, version: str) -> str:
+        # Called with the lock held inside a write transaction. Records
+        # ``version`` if it is newer than the stored one, purging the results
+        # of older versions, and returns the newest version.
+        row = self._conn.execute("SELECT version FROM corpus WHERE id = 0").fetchone()
+        if row is not None and row[0] >= version:
+            return row[0]
+        self._conn.execute("INSERT OR REPLACE INTO corpus (id, version) VALUES (0, ?)", (version,))
+        cursor = self._conn.execute("DELETE FROM results WHERE corpus_version != ?", (version,))
+        if cursor.rowcount:
+            logger.info(f"Source corpus changed; dropped {cursor.rowcount} cached results")
+        return version
+
+    def get(self, key: str, version: str) -> Optional[str]:
+        """
+        Looks up a result and marks it as recently used.
+
+        :param key: Result key, see result_key().
+        :param version: Current corpus version, see corpus_version().
+        :return: ID of the document whose report holds the result, or None.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._advance(version)
+            row = self._conn.execute(
+                "SELECT document_id FROM results WHERE key = ? AND corpus_version = ?", (key, version),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, version: str, document_id: str):
+        """
+        Records the document holding the result of a key, evicting the least recently used keys.
+
+        Results computed against an older corpus version than the newest one seen are dropped.
+
+        :param key: Result key, see result_key().
+        :param version: Corpus version the result was computed against.
+        :param document_id: ID of the document whose report holds the result.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._advance(version) != version:
+                logger.info(f"Not caching the result of document ID {document_id}; the source corpus changed")
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, document_id, corpus_version, used_at) VALUES (?, ?, ?, ?)",
+                (key, document_id, version, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def discard(self, key: str):
+        """
+        Forgets a key whose report no longer exists.
+
+        :param key: Result key.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Returns the process-wide result cache, or None when RESULT_CACHE_SIZE is 0.
+    """
+    global _result_cache
+    if RESULT_CACHE_SIZE <= 0:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
+
+def reuse_result(document_id: str, key: str, version: str) -> Optional[str]:
+    """
+    Answers a job from the result cache by copying the cached report.
+
+    :param document_id: Identifier of the new document.
+    :param key: Result key of the new document.
+    :param version: Current corpus version.
+    :return: ID of the document the report was copied from, or None on a miss.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    source_id = cache.get(key, version)
+    report = load_report(source_id) if source_id is not None else None
+    if report is None:
+        if source_id is not None:
+            # The cached report expired (REPORT_TTL); recompute it.
+            cache.discard(key)
+        CACHE_REQUESTS.inc('result', 'miss')
+        return None
+    CACHE_REQUESTS.inc('result', 'hit')
+    report = {name: value for name, value in report.items() if name not in ('document_id', 'created_at', 'version')}
+    save_report(document_id, dict(report, reused_from=source_id))
+    logger.info(f"Reused the report of document ID {source_id} for identical document ID {document_id}")
+    return source_id
+
+def remember_result(document_id: str, key: str, version: str):
+    """
+    Records the report of a finished job in the result cache.
+
+    :param document_id: Identifier of the document whose report was saved.
+    :param key: Result key of the document.
+    :param version: Corpus version the report was computed against.
+    """
+    cache = get_result_cache()
+    if cache is not None:
+        cache.put(key, version, document_id)
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from typing import Dict, List, Set, Tuple
+
+class StatusBroadcaster:
+    """
+    Fans job status changes out to asyncio subscribers.
+
+    JobQueue calls publish() from whichever thread changed the job (request
+    handler, dispatcher, progress listener); each subscriber gets the update
+    on its own event loop through call_soon_threadsafe, so streaming
+    endpoints never poll.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def subscribe(self, document_id: str) -> asyncio.Queue:
+        """
+        Registers the calling event loop for updates of one document.
+
+        :param document_id: Identifier of the document.
+        :return: Queue that receives status snapshots.
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(document_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, document_id: str, queue: asyncio.Queue):
+        """
+        Removes a subscriber registered with subscribe().
+
+        :param document_id: Identifier of the document.
+        :param queue: The queue returned by subscribe().
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(document_id)
+            if subscribers is None:
+                return
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                del self._subscribers[document_id]
+
+    def publish(self, status: Dict):
+        """
+        Delivers a status snapshot to every subscriber of its document.
+
+        :param status: Status dictionary as returned by JobQueue.status().
+        """
+        with self._lock:
+            subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = list(
+                self._subscribers.get(status['document_id'], ())
+            )
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, status)
+            except RuntimeError:
+                # The subscriber's loop is already closed.
+                self.unsubscribe(status['document_id'], queue)
@@ -0,0 +1,365 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from backend.app.utils.logging_config import logger
+
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', '..', 'jobs.db'))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', 1000))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+STATUS_CACHE_SIZE = int(os.getenv('STATUS_CACHE_SIZE', 100000))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_COLUMNS = ("document_id", "state", "attempts", "progress", "error", "created_at", "started_at", "finished_at",
+            "batch_id", "filename")
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at MAX_QUEUE_DEPTH."""
+
+class JobQueue:
+    """
+    Durable FIFO of plagiarism jobs backed by SQLite, with an in-memory status store.
+
+    Every job is a row keyed by document ID that moves through
+    queued -> running -> completed | failed. Failed attempts are re-queued
+    until ``max_attempts`` is reached.
+
+    Several API processes may share the database, e.g. during a rolling
+    restart. A claimed job is leased to the claiming queue for
+    ``lease_seconds``; its owner renews the lease with renew_leases() while
+    the job runs, and recover() only re-queues jobs whose lease expired, so
+    jobs of a crashed process are retried and jobs of a live one are never
+    taken over.
+
+    Every state change is written through to SQLite and mirrored in an
+    in-memory map of the most recent ``status_cache_size`` jobs. Jobs this
+    queue claimed and finished jobs are answered from memory; queued and
+    running jobs of other processes are re-read from SQLite. Progress updates
+    are transient and only kept in memory of the process running the job.
+    The queue depth is counted in memory and recounted from SQLite by
+    recover(). Listeners registered with add_listener() receive a status
+    snapshot after every change made by this queue.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, max_depth: int = MAX_QUEUE_DEPTH,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, status_cache_size: int = STATUS_CACHE_SIZE,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        self.path = path
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.status_cache_size = status_cache_size
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._owned: Set[str] = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                document_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                progress INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                batch_id TEXT,
+                filename TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in (("progress", "INTEGER NOT NULL DEFAULT 0"), ("started_at", "REAL"),
+                                   ("finished_at", "REAL"), ("batch_id", "TEXT"), ("filename", "TEXT"),
+                                   ("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._statuses: "OrderedDict[str, Dict]" = OrderedDict()
+        rows = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (status_cache_size,)
+        ).fetchall()
+        for row in reversed(rows):
+            self._statuses[row[0]] = dict(zip(_COLUMNS, row))
+        self._depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()[0]
+
+    def _cache(self, status: Dict):
+        self._statuses[status['document_id']] = status
+        self._statuses.move_to_end(status['document_id'])
+        while len(self._statuses) > self.status_cache_size:
+            self._statuses.popitem(last=False)
+
+    def _load(self, document_id: str) -> Optional[Dict]:
+        status = self._statuses.get(document_id)
+        if status is not None and status['state'] in (QUEUED, RUNNING) and document_id not in self._owned:
+            # Another process may have claimed or finished the job since it was cached
+            status = None
+        if status is None:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE document_id = ?", (document_id,)
+            ).fetchone()
+            if row is not None:
+                status = dict(zip(_COLUMNS, row))
+                self._cache(status)
+        return status
+
+    def _release(self, document_id: str, **fields) -> bool:
+        # Writes the outcome of a job this queue claimed and gives up its lease.
+        # Returns False, changing nothing, if the lease expired and the job was
+        # recovered by another process in the meantime.
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        cursor = self._conn.execute(
+            f"UPDATE jobs SET {assignments}, owner = NULL, lease_until = NULL, updated_at = ? "
+            f"WHERE document_id = ? AND owner = ? AND state = ?",
+            (*fields.values(), time.time(), document_id, self.owner, RUNNING),
+        )
+        self._owned.discard(document_id)
+        if not cursor.rowcount:
+            logger.warning(f"Lease on job {document_id} was lost; not recording its outcome")
+            self._statuses.pop(document_id, None)
+            return False
+        status = self._load(document_id)
+        if status is not None:
+            status.update(fields)
+        return True
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """
+        Registers a callback that receives a status snapshot after every job change.
+
+        :param listener: Callable taking a status dictionary. Called from the
+            thread that made the change, so it must be thread-safe and quick.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, *document_ids: str):
+        if not self._listeners:
+            return
+        for document_id in document_ids:
+            status = self.status(document_id)
+            if status is None:
+                continue
+            for listener in self._listeners:
+                try:
+                    listener(status)
+                except Exception as e:
+                    logger.exception(f"Job status listener failed: {e}")
+
+    def depth(self) -> int:
+        """
+        Returns the number of jobs waiting to run.
+        """
+        return self._depth
+
+    def enqueue(self, document_id: str, filename: Optional[str] = None):
+        """
+        Adds a job to the queue.
+
+        :param document_id: Identifier of the uploaded document.
+        :param filename: Original name of the uploaded file.
+        :raises QueueFullError: If the queue already holds max_depth jobs.
+        """
+        self.enqueue_many([(document_id, filename)])
+
+    def enqueue_many(self, documents: Sequence[Tuple[str, Optional[str]]], batch_id: Optional[str] = None):
+        """
+        Adds several jobs to the queue in one transaction, all or nothing.
+
+        :param documents: (document_id, filename) pairs.
+        :param batch_id: Identifier grouping the jobs of one batch upload.
+        :raises QueueFullError: If the jobs do not all fit below max_depth.
+        """
+        now = time.time()
+        with self._lock:
+            if self._depth + len(documents) > self.max_depth:
+                raise QueueFullError(f"Job queue is full ({self._depth} jobs waiting).")
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO jobs (document_id, state, batch_id, filename, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(document_id, QUEUED, batch_id, filename, now, now) for document_id, filename in documents],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for document_id, filename in documents:
+                self._cache({
+                    'document_id': document_id, 'state': QUEUED, 'attempts': 0, 'progress': 0,
+                    'error': None, 'created_at': now, 'started_at': None, 'finished_at': None,
+                    'batch_id': batch_id, 'filename': filename,
+                })
+            self._depth += len(documents)
+        if batch_id is not None:
+            logger.info(f"Queued batch {batch_id} with {len(documents)} jobs")
+        else:
+            logger.info(f"Queued job for document ID {documents[0][0]}")
+        self._notify(*(document_id for document_id, _ in documents))
+
+    def batch_statuses(self, batch_id: str) -> List[Dict]:
+        """
+        Returns the status of every job in a batch.
+
+        :param batch_id: Identifier of the batch.
+        :return: Status dictionaries, empty if the batch is unknown.
+        """
+        with self._lock:
+            document_ids = [row[0] for row in self._conn.execute(
+                "SELECT document_id FROM jobs WHERE batch_id = ? ORDER BY created_at, rowid", (batch_id,)
+            )]
+            return [dict(self._load(document_id)) for document_id in document_ids]
+
+    def claim(self, limit: int) -> List[str]:
+        """
+        Atomically moves up to ``limit`` of the oldest queued jobs to running.
+
+        :param limit: Maximum number of jobs to claim.
+        :return: The claimed document IDs.
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT document_id FROM jobs WHERE state = ? ORDER BY created_at LIMIT ?",
+                    (QUEUED, limit),
+                ).fetchall()
+                document_ids = [row[0] for row in rows]
+                self._conn.executemany(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, progress = 0, started_at = ?, "
+                    "owner = ?, lease_until = ?, updated_at = ? WHERE document_id = ?",
+                    [(RUNNING, now, self.owner, now + self.lease_seconds, now, document_id)
+                     for document_id in document_ids],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._owned.update(document_ids)
+            for document_id in document_ids:
+                self._statuses.pop(document_id, None)
+                self._load(document_id)
+            self._depth -= len(document_ids)
+        self._notify(*document_ids)
+        return document_ids
+
+    def set_progress(self, document_id: str, progress: int):
+        """
+        Records the progress of a running job, in percent. Kept in memory only.
+
+        :param document_id: Identifier of the document.
+        :param progress: Completion percentage, 0-100.
+        """
+        with self._lock:
+            status = self._statuses.get(document_id)
+            progress = max(0, min(100, int(progress)))
+            if status is None or status['state'] != RUNNING or status['progress'] == progress:
+                return
+            status['progress'] = progress
+        self._notify(document_id)
+
+    def complete(self, document_id: str):
+        """
+        Marks a job claimed by this queue as completed.
+
+        :param document_id: Identifier of the document.
+        """
+        with self._lock:
+            released = self._release(document_id, state=COMPLETED, progress=100, error=None, finished_at=time.time())
+        if released:
+            self._notify(document_id)
+
+    def fail(self, document_id: str, error: str) -> Optional[str]:
+        """
+        Records a failed attempt of a job claimed by this queue, re-queueing it while attempts remain.
+
+        :param document_id: Identifier of the document.
+        :param error: Description of the failure.
+        :return: The job's new state, queued or failed, or None if its lease was lost.
+        """
+        with self._lock:
+            status = self._load(document_id)
+            if status is not None and status['attempts'] < self.max_attempts:
+                state = QUEUED
+                released = self._release(document_id, state=state, error=error)
+                self._depth += released
+            else:
+                state = FAILED
+                released = self._release(document_id, state=state, error=error, finished_at=time.time())
+        if not released:
+            return None
+        logger.warning(f"Job for document ID {document_id} failed ({error}); now {state}")
+        self._notify(document_id)
+        return state
+
+    def status(self, document_id: str) -> Optional[Dict]:
+        """
+        Returns a snapshot of a job's status: state, attempts, progress, error and timings.
+
+        :param document_id: Identifier of the document.
+        :return: Status dictionary, or None if the job is unknown.
+        """
+        with self._lock:
+            status = self._load(document_id)
+            return dict(status) if status is not None else None
+
+    def state(self, document_id: str) -> Optional[str]:
+        """
+        Returns the state of a job, or None if it is unknown.
+
+        :param document_id: Identifier of the document.
+        """
+        status = self.status(document_id)
+        return status['state'] if status is not None else None
+
+    def renew_leases(self):
+        """
+        Extends the leases of the running jobs this queue claimed.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND state = ?",
+                (time.time() + self.lease_seconds, self.owner, RUNNING),
+            )
+
+    def recover(self) -> int:
+        """
+        Re-queues running jobs whose lease expired, because the process running
+        them crashed or stopped, and recounts the queue depth.
+
+        :return: Number of recovered jobs.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE state = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (QUEUED, now, RUNNING, now),
+            )
+            self._depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()[0]
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} interrupted jobs")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,231 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from backend.app.agents.rabin_karp import get_source_index
+from backend.app.agents.shards import get_shard_client
+from backend.app.jobs.job_queue import JobQueue
+from backend.app.processors.document_processor import process_document_for_plagiarism
+from backend.app.utils.fingerprints import DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW
+from backend.app.utils.logging_config import logger, setup_logging
+from backend.app.utils import metrics
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', os.cpu_count() or 1))
+JOB_START_METHOD = os.getenv('JOB_START_METHOD', 'spawn')
+DISPATCH_POLL_INTERVAL = float(os.getenv('DISPATCH_POLL_INTERVAL', 1.0))
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 600))
+
+_progress_queue = None
+_warmup_barrier = None
+_warmup = {'seconds': 0.0, 'fingerprints': None}
+
+def _init_worker(progress_queue, warmup_barrier):
+    """
+    Warms the source index once per worker process so jobs never pay for it.
+
+    :param progress_queue: Queue the worker reports job progress and metrics on.
+    :param warmup_barrier: Barrier all workers of the pool meet at in _warm_up().
+    """
+    global _progress_queue, _warmup_barrier
+    setup_logging()
+    _progress_queue = progress_queue
+    _warmup_barrier = warmup_barrier
+    if get_shard_client() is not None:
+        logger.info(f"Worker {os.getpid()} ready; source index served by shard servers")
+        return
+    started = time.perf_counter()
+    index = get_source_index(DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW)
+    _warmup.update(seconds=time.perf_counter() - started, fingerprints=len(index))
+    progress_queue.put(('metrics', metrics.drain()))
+    logger.info(f"Worker {os.getpid()} ready with {len(index)} source fingerprints in {_warmup['seconds']:.2f}s")
+
+def _warm_up(timeout: float) -> Dict:
+    # Runs inside a worker process once its initializer is done. The barrier
+    # holds every worker until all of them got one of these tasks, so each
+    # process of the pool reports exactly once.
+    _warmup_barrier.wait(timeout)
+    return dict(_warmup, pid=os.getpid())
+
+def run_job(document_id: str):
+    """
+    Entry point executed inside a worker process.
+
+    :param document_id: Identifier of the document to process.
+    """
+    def report_progress(progress: int):
+        if _progress_queue is not None:
+            _progress_queue.put(('progress', document_id, progress))
+
+    try:
+        process_document_for_plagiarism(document_id, progress=report_progress)
+    finally:
+        # Ship what this job recorded to the API process, which serves /metrics
+        if _progress_queue is not None:
+            _progress_queue.put(('metrics', metrics.drain()))
+
+class WorkerPool:
+    """
+    Runs queued jobs on a bounded pool of worker processes.
+
+    A dispatcher thread claims at most as many jobs as there are idle workers,
+    so the queue, not the pool, absorbs bursts. Completion and failure are
+    written back to the JobQueue; a crashed pool is replaced and the jobs it
+    was running are retried. Every third of the job lease the dispatcher
+    renews the leases of the running jobs and recovers jobs whose lease
+    expired, e.g. because another API process sharing the queue crashed
+    (see JobQueue). Workers report progress over a multiprocessing
+    queue that a listener thread forwards to the JobQueue status store; the
+    same queue carries the workers' metrics into this process (see
+    utils/metrics.py).
+    """
+
+    def __init__(self, job_queue: JobQueue, workers: int = JOB_WORKERS):
+        self.job_queue = job_queue
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, Future] = {}
+        self._claimed_at: Dict[str, float] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pool_broken = False
+        self._mp_context = multiprocessing.get_context(JOB_START_METHOD)
+        self._progress_queue = self._mp_context.Queue()
+        self._progress_thread: Optional[threading.Thread] = None
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=(self._progress_queue, self._mp_context.Barrier(self.workers)),
+        )
+
+    def start(self):
+        """
+        Re-queues interrupted jobs, starts the worker processes and the dispatcher.
+        """
+        self.job_queue.recover()
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+        self._progress_thread = threading.Thread(target=self._progress_loop, name="job-progress", daemon=True)
+        self._progress_thread.start()
+        logger.info(f"Worker pool started with {self.workers} workers")
+
+    def warm_up(self, timeout: float = WARMUP_TIMEOUT) -> Dict:
+        """
+        Starts every worker process and waits until all of them have loaded the source index.
+
+        :param timeout: Seconds to wait for the workers.
+        :return: Dict with the number of ``workers``, the wall-clock ``seconds``
+            the warm-up took, the slowest ``worker_seconds`` spent loading the
+            index and the ``index_fingerprints`` (None with shard servers).
+        :raises Exception: If a worker fails to start or the timeout passes.
+        """
+        started = time.perf_counter()
+        futures = [self._executor.submit(_warm_up, timeout) for _ in range(self.workers)]
+        results = [future.result(timeout=timeout) for future in futures]
+        stats = {
+            'workers': len(results),
+            'seconds': time.perf_counter() - started,
+            'worker_seconds': max(result['seconds'] for result in results),
+            'index_fingerprints': results[0]['fingerprints'],
+        }
+        logger.info(f"Warmed up {stats['workers']} workers in {stats['seconds']:.2f}s")
+        return stats
+
+    def stop(self):
+        """
+        Stops dispatching and waits for running jobs to finish.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._progress_thread is not None:
+            self._progress_queue.put(None)
+            self._progress_thread.join()
+        logger.info("Worker pool stopped")
+
+    def running(self) -> int:
+        """
+        Returns the number of jobs currently running in the workers.
+        """
+        with self._lock:
+            return len(self._in_flight)
+
+    def notify(self):
+        """
+        Wakes the dispatcher after a job was queued.
+        """
+        self._wakeup.set()
+
+    def _dispatch_loop(self):
+        last_sweep = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(DISPATCH_POLL_INTERVAL)
+            self._wakeup.clear()
+            try:
+                if time.monotonic() - last_sweep >= self.job_queue.lease_seconds / 3:
+                    last_sweep = time.monotonic()
+                    self.job_queue.renew_leases()
+                    self.job_queue.recover()
+                self._dispatch()
+            except Exception as e:
+                logger.exception(f"Job dispatcher error: {e}")
+
+    def _progress_loop(self):
+        while True:
+            update = self._progress_queue.get()
+            if update is None:
+                return
+            if update[0] == 'metrics':
+                metrics.merge(update[1])
+            else:
+                self.job_queue.set_progress(*update[1:])
+
+    def _dispatch(self):
+        if self._pool_broken:
+            logger.error("Worker pool is broken; starting a new one")
+            self._executor.shutdown(wait=False)
+            self._executor = self._new_executor()
+            self._pool_broken = False
+
+        with self._lock:
+            idle = self.workers - len(self._in_flight)
+        for document_id in self.job_queue.claim(idle):
+            claimed_at = time.monotonic()
+            try:
+                future = self._executor.submit(run_job, document_id)
+            except BrokenProcessPool as e:
+                self._pool_broken = True
+                self.job_queue.fail(document_id, f"{type(e).__name__}: {e}")
+                continue
+            with self._lock:
+                self._in_flight[document_id] = future
+                self._claimed_at[document_id] = claimed_at
+            future.add_done_callback(lambda f, document_id=document_id: self._on_done(document_id, f))
+
+    def _on_done(self, document_id: str, future: Future):
+        with self._lock:
+            self._in_flight.pop(document_id, None)
+            claimed_at = self._claimed_at.pop(document_id, None)
+        error = future.exception()
+        if claimed_at is not None:
+            metrics.JOB_SECONDS.observe(time.monotonic() - claimed_at, 'failed' if error else 'completed')
+        if error is None:
+            self.job_queue.complete(document_id)
+            logger.info(f"Job for document ID {document_id} completed")
+        else:
+            self.job_queue.fail(document_id, f"{type(error).__name__}: {error}")
+            if isinstance(error, BrokenProcessPool):
+                self._pool_broken = True
+        self._wakeup.set()
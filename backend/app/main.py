@@ -1,79 +1,359 @@
 import os
+import json
+import time
 import uuid
-import logging
+import asyncio
+import shutil
+import tarfile
+import zipfile
+from collections import Counter
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
-from fastapi.responses import PlainTextResponse
-from swarm import Swarm
-from backend.app.database.file_reports import get_report
-from backend.app.processors.document_processor import process_document_for_plagiarism
-import aiofiles
-import openai
-from backend.app.utils.logging_config import logger
 
-# Load environment variables from .env file
+# Load environment variables from .env file. The settings of the backend
+# modules are read when they are imported, so this comes first; worker
+# processes inherit the environment.
 load_dotenv()
 
-# After load_dotenv()
-#print(f"OpenAI API Keyyyy: {os.getenv('OPENAI_API_KEY')}")
-
-# Set OpenAI API key
-openai.api_key = os.getenv('OPENAI_API_KEY')  # Ensure this environment variable is set
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from backend.app.database.file_reports import (
+    REPORT_PAGE_SIZE,
+    REPORTS_PATH,
+    cleanup_expired,
+    load_report,
+    report_matches,
+    target_path,
+)
+from backend.app.database.report_cache import ReportCache, available_encodings
+from backend.app.jobs.events import StatusBroadcaster
+from backend.app.jobs.job_queue import COMPLETED, FAILED, JobQueue, QueueFullError
+from backend.app.jobs.workers import WorkerPool
+from backend.app.utils import metrics
+import aiofiles
+from backend.app.utils.logging_config import logger, setup_logging
 
 # Configuration Settings
-REPORTS_PATH = os.getenv('REPORTS_PATH', 'reports')
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 1048576))  # Default to 1MB
 ALLOWED_CONTENT_TYPES = os.getenv('ALLOWED_CONTENT_TYPES', 'text/plain').split(',')
-LOG_FILE = os.getenv('LOG_FILE', 'E:/Github/swarm-openai/app.log')
+SSE_KEEPALIVE_INTERVAL = float(os.getenv('SSE_KEEPALIVE_INTERVAL', 15))
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 1000))
+MAX_ARCHIVE_SIZE = int(os.getenv('MAX_ARCHIVE_SIZE', 104857600))  # Default to 100MB
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1048576))
+CLEANUP_INTERVAL = float(os.getenv('CLEANUP_INTERVAL', 3600))  # seconds between report store cleanups
+REPORT_CACHE_CONTROL = os.getenv('REPORT_CACHE_CONTROL', 'private, no-cache')
+
+# Durable job queue and the worker processes that drain it, created by lifespan()
+job_queue: Optional[JobQueue] = None
+worker_pool: Optional[WorkerPool] = None
+
+# Pushes job status changes to /events subscribers
+status_broadcaster = StatusBroadcaster()
+
+# Rendered reports served by /report
+report_cache = ReportCache()
+
+_cleanup_task: Optional[asyncio.Task] = None
+_warmup_task: Optional[asyncio.Task] = None
+
+# Startup phases and their durations, reported by /ready
+startup_state: Dict = {'ready': False, 'phases': {}, 'error': None}
+
+# Gauges read from this process's state whenever /metrics is scraped
+QUEUE_DEPTH = metrics.Gauge("plagiarism_queue_depth", "Jobs waiting in the queue.")
+JOBS_RUNNING = metrics.Gauge("plagiarism_jobs_running", "Jobs running in the worker processes.")
+REPORT_CACHE_ENTRIES = metrics.Gauge("plagiarism_report_cache_entries", "Rendered reports held by the /report cache.")
+REPORT_CACHE_SIZE = metrics.Gauge("plagiarism_report_cache_bytes", "Bytes held by the /report cache.")
+
+async def cleanup_report_store():
+    """
+    Periodically removes expired target documents and reports, see cleanup_expired().
+    """
+    while True:
+        try:
+            await run_in_threadpool(cleanup_expired)
+        except Exception as e:
+            logger.exception(f"Report store cleanup failed: {e}")
+        await asyncio.sleep(CLEANUP_INTERVAL)
 
-app = FastAPI()
-swarm = Swarm()
+async def warm_up_workers():
+    """
+    Starts the worker processes and loads the source index in each, then marks the service ready.
+    """
+    try:
+        stats = await run_in_threadpool(worker_pool.warm_up)
+    except Exception as e:
+        logger.exception(f"Worker warm-up failed: {e}")
+        startup_state['error'] = f"{type(e).__name__}: {e}"
+        return
+    startup_state['phases']['warm_up'] = stats['seconds']
+    startup_state['workers'] = stats['workers']
+    startup_state['index_fingerprints'] = stats['index_fingerprints']
+    startup_state['ready'] = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the job queue and starts the workers; the source index is warmed
+    in the background so the API accepts requests right away (see /ready).
+    """
+    global job_queue, worker_pool, _cleanup_task, _warmup_task
+    setup_logging()
+    started = time.perf_counter()
+    os.makedirs(REPORTS_PATH, exist_ok=True)
+    job_queue = JobQueue()
+    job_queue.add_listener(status_broadcaster.publish)
+    worker_pool = WorkerPool(job_queue)
+    worker_pool.start()
+    startup_state['phases']['start'] = time.perf_counter() - started
+    _warmup_task = asyncio.create_task(warm_up_workers())
+    _cleanup_task = asyncio.create_task(cleanup_report_store())
+    try:
+        yield
+    finally:
+        _cleanup_task.cancel()
+        _warmup_task.cancel()
+        await run_in_threadpool(worker_pool.stop)
+        job_queue.close()
+
+app = FastAPI(lifespan=lifespan)
 
-# Ensure the reports directory exists at startup
-os.makedirs(REPORTS_PATH, exist_ok=True)
+class UploadTooLargeError(Exception):
+    """Raised when an uploaded document exceeds MAX_FILE_SIZE while being saved."""
+
+async def save_upload(file: UploadFile, file_path: str, limit: int = MAX_FILE_SIZE) -> int:
+    """
+    Copies an uploaded file to disk in chunks, stopping as soon as it exceeds the limit.
+
+    :param file: The uploaded file.
+    :param file_path: Destination path.
+    :param limit: Maximum number of bytes accepted.
+    :return: Number of bytes written.
+    :raises UploadTooLargeError: If the upload exceeds the limit; the partial file is removed.
+    """
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as out_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLargeError(f"{file.filename} exceeds the limit of {limit} bytes.")
+                await out_file.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return size
 
 @app.post("/upload", summary="Upload a document for plagiarism detection")
-async def upload_document(file: UploadFile = File(...), *,background_tasks: BackgroundTasks):
+async def upload_document(file: UploadFile = File(...)):
     """
     Upload a document for plagiarism detection.
 
     - **file**: The file to be uploaded. Must be a plain text file and not exceed the maximum allowed size.
-    - **background_tasks**: Handles asynchronous processing of the uploaded document.
-    
-    Returns a confirmation message with a unique document ID.
+
+    The document is queued for processing by the worker pool. Returns a
+    confirmation message with a unique document ID, or 429 if the queue is full.
     """
+    # Backpressure: refuse work early while the queue is full
+    if job_queue.depth() >= job_queue.max_depth:
+        logger.warning("Job queue is full; rejecting upload")
+        raise HTTPException(status_code=429, detail="Too many documents queued. Please retry later.")
+
     # Input Validation
     if file.content_type not in ALLOWED_CONTENT_TYPES:
         logger.warning(f"Unsupported file type: {file.content_type}")
         raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed types: {ALLOWED_CONTENT_TYPES}")
     
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        logger.warning(f"File size exceeded: {len(contents)} bytes")
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        logger.warning(f"File size exceeded: {file.size} bytes")
         raise HTTPException(status_code=400, detail=f"File size exceeds the limit of {MAX_FILE_SIZE} bytes.")
     
+    # Generate a unique document ID
+    document_id = str(uuid.uuid4())
+    
+    # Define the file path
+    file_path = target_path(document_id)
+    
     try:
-        # Generate a unique document ID
-        document_id = str(uuid.uuid4())
-        
-        # Define the file path
-        file_path = os.path.join(REPORTS_PATH, f"{document_id}_target.txt")
-        
-        # Asynchronously save the uploaded file
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            await out_file.write(contents)
-            logger.info(f"Saved uploaded file to {file_path}")
-        
-        # Add a background task to process the document for plagiarism
-        background_tasks.add_task(process_document_for_plagiarism, document_id)
-        logger.info(f"Started plagiarism processing for document ID {document_id}")
+        # Stream the upload to disk, stopping at the size limit
+        size = await save_upload(file, file_path)
+        logger.info(f"Saved uploaded file ({size} bytes) to {file_path}")
+
+        # Queue the document for plagiarism processing
+        job_queue.enqueue(document_id, file.filename)
+        worker_pool.notify()
+        logger.info(f"Queued plagiarism processing for document ID {document_id}")
         
         return {"message": "Document uploaded successfully.", "document_id": document_id}
     
+    except UploadTooLargeError as e:
+        logger.warning(f"File size exceeded: {e}")
+        raise HTTPException(status_code=400, detail=f"File size exceeds the limit of {MAX_FILE_SIZE} bytes.")
+    except QueueFullError:
+        logger.warning(f"Job queue is full; discarding upload {document_id}")
+        _discard([file_path])
+        raise HTTPException(status_code=429, detail="Too many documents queued. Please retry later.")
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
+        _discard([file_path])
         raise HTTPException(status_code=500, detail="Failed to upload document.")
 
+def _new_target_path() -> Tuple[str, str]:
+    document_id = str(uuid.uuid4())
+    return document_id, target_path(document_id)
+
+def _discard(file_paths: List[str]):
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def _check_batch_size(saved_paths: List[str]):
+    if len(saved_paths) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_FILES} documents.")
+
+def _save_member(source: BinaryIO, name: str, size: int, saved_paths: List[str]) -> Tuple[str, str]:
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail=f"{name} exceeds the limit of {MAX_FILE_SIZE} bytes.")
+    document_id, file_path = _new_target_path()
+    saved_paths.append(file_path)
+    _check_batch_size(saved_paths)
+    with open(file_path, 'wb') as out_file:
+        shutil.copyfileobj(source, out_file, UPLOAD_CHUNK_SIZE)
+    return document_id, os.path.basename(name)
+
+def _extract_archive(filename: str, archive_file: BinaryIO, saved_paths: List[str]) -> List[Tuple[str, str]]:
+    """
+    Extracts the plain text members of a zip or tar archive straight to target files.
+
+    Members are streamed from the (spooled) upload to disk one at a time, so
+    neither the archive nor its members are held in memory.
+
+    :param filename: Name of the uploaded archive, used to pick the format.
+    :param archive_file: Seekable file object holding the archive.
+    :param saved_paths: List that every created target file is appended to, for cleanup.
+    :return: List of (document ID, member file name) for every .txt member.
+    """
+    documents = []
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.txt'):
+                    continue
+                with archive.open(info) as member:
+                    documents.append(_save_member(member, info.filename, info.file_size, saved_paths))
+    else:
+        with tarfile.open(fileobj=archive_file, mode='r:*') as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith('.txt'):
+                    continue
+                documents.append(_save_member(archive.extractfile(member), member.name, member.size, saved_paths))
+    return documents
+
+@app.post("/upload/batch", summary="Upload many documents for plagiarism detection")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """
+    Upload a batch of documents for plagiarism detection.
+
+    - **files**: Plain text files and/or zip/tar archives of `.txt` files.
+
+    All documents are queued together as one batch and spread across the
+    worker pool, whose processes already hold the source index. Returns the
+    batch ID and one document ID per file; returns 429 if the whole batch
+    does not fit in the queue.
+    """
+    entries = []
+    saved_paths = []
+    try:
+        for file in files:
+            filename = file.filename or "document.txt"
+            if filename.lower().endswith(ARCHIVE_SUFFIXES):
+                if file.size is not None and file.size > MAX_ARCHIVE_SIZE:
+                    raise HTTPException(status_code=400, detail=f"{filename} exceeds the limit of {MAX_ARCHIVE_SIZE} bytes.")
+                try:
+                    entries.extend(await run_in_threadpool(_extract_archive, filename, file.file, saved_paths))
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    logger.warning(f"Invalid archive {filename}: {e}")
+                    raise HTTPException(status_code=400, detail=f"{filename} is not a valid archive.")
+            else:
+                if file.content_type not in ALLOWED_CONTENT_TYPES:
+                    raise HTTPException(status_code=400, detail=f"Unsupported file type for {filename}. Allowed types: {ALLOWED_CONTENT_TYPES}")
+                document_id, file_path = _new_target_path()
+                saved_paths.append(file_path)
+                _check_batch_size(saved_paths)
+                await save_upload(file, file_path)
+                entries.append((document_id, filename))
+
+        if not entries:
+            raise HTTPException(status_code=400, detail="No text documents found in the upload.")
+        if job_queue.depth() + len(entries) > job_queue.max_depth:
+            logger.warning(f"Job queue cannot take a batch of {len(entries)} documents")
+            raise QueueFullError(f"Job queue cannot take {len(entries)} more jobs.")
+
+        batch_id = str(uuid.uuid4())
+        job_queue.enqueue_many(entries, batch_id)
+        worker_pool.notify()
+    except HTTPException:
+        _discard(saved_paths)
+        raise
+    except UploadTooLargeError as e:
+        _discard(saved_paths)
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError:
+        _discard(saved_paths)
+        raise HTTPException(status_code=429, detail="Too many documents queued. Please retry later.")
+    except Exception as e:
+        _discard(saved_paths)
+        logger.error(f"Error uploading batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to upload batch.")
+
+    logger.info(f"Queued batch {batch_id} with {len(entries)} documents")
+    return {
+        "message": "Batch uploaded successfully.",
+        "batch_id": batch_id,
+        "documents": [{"document_id": document_id, "filename": filename} for document_id, filename in entries],
+    }
+
+@app.get("/batch/{batch_id}", summary="Check the processing status of a batch")
+async def check_batch_status(batch_id: str):
+    """
+    Check the processing status of a batch upload.
+
+    - **batch_id**: The identifier returned by `/upload/batch`.
+
+    Returns per-state counts, whether every document has finished, and the
+    status of each document.
+    """
+    statuses = job_queue.batch_statuses(batch_id)
+    if not statuses:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    counts = Counter(status['state'] for status in statuses)
+    return {
+        "batch_id": batch_id,
+        "total": len(statuses),
+        "counts": dict(counts),
+        "finished": counts[COMPLETED] + counts[FAILED] == len(statuses),
+        "documents": [_status_payload(status) for status in statuses],
+    }
+
+def _status_payload(status: dict) -> dict:
+    return {
+        "status": status['state'],
+        "document_id": status['document_id'],
+        "progress": status['progress'],
+        "attempts": status['attempts'],
+        "error": status['error'],
+        "queued_at": status['created_at'],
+        "started_at": status['started_at'],
+        "finished_at": status['finished_at'],
+        "batch_id": status['batch_id'],
+        "filename": status['filename'],
+    }
+
 @app.get("/status/{document_id}", summary="Check the processing status of a document")
 async def check_status(document_id: str):
     """
@@ -81,37 +361,190 @@ async def check_status(document_id: str):
 
     - **document_id**: The unique identifier of the document.
 
-    Returns the status of the document processing.
+    Returns the job state (queued, running, completed or failed), progress in
+    percent, attempts, the last error and timings. Returns 404 for unknown IDs.
     """
-    try:
-        report_file = os.path.join(REPORTS_PATH, f"{document_id}_report.txt")
-        status = "completed" if os.path.exists(report_file) else "processing"
-        logger.info(f"Checked status for document ID {document_id}: {status}")
-        return {"status": status, "document_id": document_id}
-    except Exception as e:
-        logger.error(f"Error checking status for document ID {document_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to check document status.")
+    status = job_queue.status(document_id)
+    if status is None:
+        logger.warning(f"Status requested for unknown document ID {document_id}")
+        raise HTTPException(status_code=404, detail="Document not found.")
+    logger.debug(f"Checked status for document ID {document_id}: {status['state']}")
+    return _status_payload(status)
+
+@app.get("/events/{document_id}", summary="Stream processing status updates for a document")
+async def stream_status(document_id: str):
+    """
+    Stream status updates of a document as Server-Sent Events.
+
+    - **document_id**: The unique identifier of the document.
+
+    Sends the current status immediately, then one `status` event per change
+    (state transitions and progress), and closes the stream once the job is
+    completed or failed. Comment lines are sent as keep-alives while idle.
+    """
+    updates = status_broadcaster.subscribe(document_id)
+    status = job_queue.status(document_id)
+    if status is None:
+        status_broadcaster.unsubscribe(document_id, updates)
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    async def event_stream():
+        current = status
+        try:
+            while True:
+                yield f"event: status\ndata: {json.dumps(_status_payload(current))}\n\n"
+                if current['state'] in (COMPLETED, FAILED):
+                    return
+                while True:
+                    try:
+                        current = await asyncio.wait_for(updates.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                        break
+                    except asyncio.TimeoutError:
+                        # Changes made by another API process are not published here
+                        latest = job_queue.status(document_id)
+                        if latest is not None and latest['state'] != current['state']:
+                            current = latest
+                            break
+                        yield ": keep-alive\n\n"
+        finally:
+            status_broadcaster.unsubscribe(document_id, updates)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _not_modified(request: Request, entry: dict) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or entry['etag'] in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry['last_modified']) <= since
+    return False
+
+def _negotiate_encoding(request: Request, offered: Tuple[str, ...]) -> str:
+    accepted = {}
+    for item in request.headers.get('accept-encoding', '').split(','):
+        name, _, params = item.partition(';')
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in offered:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return 'identity'
 
 @app.get("/report/{document_id}", response_class=PlainTextResponse, summary="Retrieve the plagiarism report for a document")
-def fetch_report(document_id: str):
+async def fetch_report(document_id: str, request: Request):
     """
     Retrieve the plagiarism report for a given document ID.
 
     - **document_id**: The unique identifier of the document.
 
-    Returns the content of the plagiarism report.
+    Returns the content of the plagiarism report, compressed with gzip or br
+    when the client accepts it. Reports carry an ETag and Last-Modified, and
+    conditional requests for an unchanged report get 304 Not Modified.
+    Recently fetched reports are served from memory.
     """
     try:
-        report_content = get_report(document_id)
-        if not report_content:
+        entry = report_cache.cached(document_id)
+        if entry is None:
+            entry = await run_in_threadpool(report_cache.load, document_id)
+        if entry is None:
+            return PlainTextResponse("Report not available yet.", headers={"Cache-Control": "no-store"})
+        if not entry['bodies']['identity']:
             logger.warning(f"Report not found for document ID {document_id}")
             raise HTTPException(status_code=404, detail="Report not found.")
+
+        headers = {
+            "ETag": entry['etag'],
+            "Last-Modified": formatdate(entry['last_modified'], usegmt=True),
+            "Cache-Control": REPORT_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if _not_modified(request, entry):
+            return Response(status_code=304, headers=headers)
+
+        encoding = _negotiate_encoding(request, available_encodings(len(entry['bodies']['identity'])))
+        body = entry['bodies'].get(encoding)
+        if body is None:
+            body = await run_in_threadpool(report_cache.body, document_id, entry, encoding)
+        if encoding != 'identity':
+            headers["Content-Encoding"] = encoding
         logger.info(f"Fetched report for document ID {document_id}")
-        return report_content
+        return Response(body, media_type="text/plain; charset=utf-8", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching report for document ID {document_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch report.")
 
+@app.get("/report/{document_id}/matches", summary="Page through the matched passages of a report")
+def fetch_report_matches(document_id: str, offset: int = Query(0, ge=0),
+                         limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=1000),
+                         section: Optional[str] = None,
+                         target_start: Optional[int] = Query(None, ge=0),
+                         target_end: Optional[int] = Query(None, ge=0)):
+    """
+    Retrieve the matched passages of a report as JSON, one page at a time.
+
+    - **document_id**: The unique identifier of the document.
+    - **offset**, **limit**: The page of passages to return.
+    - **section**: Only return passages of this section (Introduction, Body or Conclusion).
+    - **target_start**, **target_end**: Only return passages overlapping this range of section words.
+
+    Returns the total number of matching passages and the requested page,
+    ordered by section and position in the document.
+    """
+    try:
+        report = load_report(document_id)
+    except Exception as e:
+        logger.error(f"Error loading report for document ID {document_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch report.")
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found.")
+    return {"document_id": document_id,
+            **report_matches(report, section, target_start, target_end, offset, limit)}
+
+@app.get("/ready", summary="Check whether the service is ready")
+async def check_ready():
+    """
+    Readiness probe.
+
+    Returns 200 once every worker process has loaded the source index, and
+    503 while they are still warming up or if the warm-up failed. The body
+    lists the duration of each startup phase in seconds.
+    """
+    return Response(json.dumps(startup_state), status_code=200 if startup_state['ready'] else 503,
+                    media_type="application/json")
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics")
+def fetch_metrics():
+    """
+    Expose processing metrics in the Prometheus text format.
+
+    Includes per-stage latency histograms (plagiarism_stage_seconds: index_load,
+    tokenize, hash, lookup, verify, aggregate, llm, report_write), job durations,
+    cache hits and misses, the index size, queue depth and running jobs.
+    Worker processes report their figures after every job.
+    """
+    QUEUE_DEPTH.set(job_queue.depth())
+    JOBS_RUNNING.set(worker_pool.running())
+    entries, size = report_cache.stats()
+    REPORT_CACHE_ENTRIES.set(entries)
+    REPORT_CACHE_SIZE.set(size)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,137 +1,304 @@
-from typing import Dict
-from backend.app.agents.triage_agent import triage_agent
-from swarm import Swarm
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from backend.app.agents.triage_agent import (
+    analyze_body,
+    analyze_conclusion,
+    analyze_introduction,
+    analyze_section,
+    run_section_agent,
+)
+from backend.app.agents.llm_client import get_llm_client
+from backend.app.agents.rabin_karp import SOURCE_DOCS_PATH
+from backend.app.database.file_reports import REPORT_FORMAT_VERSION, find_target, save_report
+from backend.app.database.result_cache import corpus_version, remember_result, reuse_result
+from backend.app.utils.logging_config import logger, sample_document, setup_logging
+from backend.app.utils.metrics import timed
+from backend.app.utils.fingerprints import (
+    DEFAULT_NGRAM_SIZE,
+    FINGERPRINT_VERSION,
+    FINGERPRINT_WINDOW,
+    NORMALIZATION,
+    TEXT_CHUNK_SIZE,
+    iter_words,
+)
 import os
+import asyncio
+import codecs
+import hashlib
 import logging
-from dotenv import load_dotenv
-import openai
-import sys
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("app.log"), 
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-logger = logging.getLogger(__name__)
+from itertools import islice
 
-logger.info("Starting document processor module")
+# Processing mode: "local" runs the section analyzers in-process; "agent"
+# sends each section to its GPT-4o plagiarism agent (needs OPENAI_API_KEY).
+PROCESSING_MODE = os.getenv('PROCESSING_MODE', 'local')
+PARALLEL_SECTIONS = os.getenv('PARALLEL_SECTIONS', 'false').lower() in ('1', 'true', 'yes')
 
-# Load environment variables from .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-logger.info(f"Loading .env file from: {dotenv_path}")
-load_dotenv(dotenv_path=dotenv_path)
+SECTION_ANALYZERS = {
+    "Introduction": analyze_introduction,
+    "Body": analyze_body,
+    "Conclusion": analyze_conclusion,
+}
 
-# After load_dotenv()
-api_key = os.getenv('OPENAI_API_KEY')
-if api_key:
-    logger.info(f"OpenAI API Key loaded: {'*' * (len(api_key) - 4) + api_key[-4:]}")
-else:
-    logger.error("OPENAI_API_KEY not found in environment variables")
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+def _section_header(line: str) -> Optional[str]:
+    """
+    Returns the section a line starts, or None for a content line.
+    """
+    lowered = line.strip().lower()
+    for name in SECTION_ANALYZERS:
+        if lowered.startswith(name.lower()):
+            return name
+    return None
 
-# Initialize OpenAI client
-logger.info("Initializing OpenAI client")
-client = openai.OpenAI(api_key=api_key)
+def split_into_sections(content: Union[str, Iterable[str]]) -> Dict[str, str]:
+    """
+    Splits a document into its Introduction, Body and Conclusion sections.
 
-# Initialize Swarm client
-logger.info("Initializing Swarm client")
-swarm = Swarm(client)
+    Text before the first header belongs to the Introduction; a repeated
+    header starts its section over.
 
-def split_into_sections(content: str) -> Dict[str, str]:
+    :param content: Document text, or an iterable of its lines.
+    :return: Section name to section text.
+    """
     logger.info("Splitting document into sections")
-    sections = {}
+    lines = content.split('\n') if isinstance(content, str) else content
     current_section = "Introduction"  # Default section
-    sections[current_section] = ""
-
-    for line in content.split('\n'):
-        line = line.strip()
-        if line.lower().startswith("introduction"):
-            current_section = "Introduction"
-            sections[current_section] = ""
-        elif line.lower().startswith("body"):
-            current_section = "Body"
-            sections[current_section] = ""
-        elif line.lower().startswith("conclusion"):
-            current_section = "Conclusion"
-            sections[current_section] = ""
+    sections = {current_section: []}
+
+    for line in lines:
+        header = _section_header(line)
+        if header is not None:
+            current_section = header
+            sections[current_section] = []
         else:
-            if current_section not in sections:
-                sections[current_section] = ""
-            sections[current_section] += " " + line
+            sections[current_section].append(line.strip())
 
-    logger.debug(f"Document split into {len(sections)} sections: {', '.join(sections.keys())}")
-    return sections
+    logger.debug("Document split into %d sections: %s", len(sections), ", ".join(sections.keys()))
+    return {name: "".join(f" {line}" for line in section_lines) for name, section_lines in sections.items()}
 
-def process_document_for_plagiarism(document_id: str):
-    logger.info(f"Starting plagiarism processing for document ID: {document_id}")
-    try:
-        # Define paths
-        REPORTS_PATH = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'reports')
-        logger.debug(f"Reports path: {REPORTS_PATH}")
+def find_section_ranges(path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Streaming counterpart of split_into_sections(): locates each section in a
+    file as a byte range without loading the document.
+
+    :param path: Path to the document.
+    :return: Section name to (start, end) byte offsets of its content, for the
+        sections that contain text, in the order split_into_sections() returns them.
+    """
+    ranges: Dict[str, Optional[Tuple[int, int]]] = {}
+    current_section = "Introduction"
+    start = offset = 0
+    has_text = False
+    with open(path, 'rb') as f:
+        for line in f:
+            decoded = line.decode('utf-8', errors='replace')
+            header = _section_header(decoded)
+            if header is not None:
+                ranges[current_section] = (start, offset) if has_text else None
+                current_section, start, has_text = header, offset + len(line), False
+            elif not has_text and decoded.strip():
+                has_text = True
+            offset += len(line)
+    ranges[current_section] = (start, offset) if has_text else None
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Found sections in %s: %s", path, ", ".join(name for name, span in ranges.items() if span))
+    return {name: span for name, span in ranges.items() if span is not None}
+
+def read_section(path: str, start: int, end: int, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams the text of a byte range of a UTF-8 file in chunks. Invalid bytes
+    are replaced, as in find_section_ranges().
+
+    :param path: Path to the document.
+    :param start: Start byte offset.
+    :param end: End byte offset.
+    :param chunk_size: Number of bytes read at a time.
+    :return: Iterator of text chunks.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield decoder.decode(data)
+        yield decoder.decode(b'', final=True)
+
+def result_key(path: str, mode: str = PROCESSING_MODE, n: int = DEFAULT_NGRAM_SIZE) -> str:
+    """
+    Hashes what a document's report depends on: its normalized section texts,
+    the processing mode and the detection parameters.
+
+    :param path: Path to the document.
+    :param mode: "local" or "agent".
+    :param n: Size of the n-grams.
+    :return: Hex digest identifying the result; documents differing only in
+        case, punctuation or whitespace share it.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(
+        f"{mode}\0{n}\0{FINGERPRINT_WINDOW}\0{FINGERPRINT_VERSION}\0{NORMALIZATION}\0{REPORT_FORMAT_VERSION}".encode()
+    )
+    for name, (start, end) in find_section_ranges(path).items():
+        digest.update(f"\x1e{name}\x1f".encode())
+        words = iter_words(read_section(path, start, end))
+        while batch := list(islice(words, 65536)):
+            digest.update(" ".join(batch).encode('utf-8'))
+            digest.update(b" ")
+    return digest.hexdigest()
+
+def find_cached_result(document_id: str, mode: str = PROCESSING_MODE) -> Tuple[str, str, Optional[str]]:
+    """
+    Answers a job from the result cache when an identical document was already analyzed
+    against the current corpus.
+
+    :param document_id: Identifier of the uploaded document.
+    :param mode: "local" or "agent".
+    :return: (result key, corpus version, ID of the document the report was
+        copied from or None on a miss).
+    """
+    key = result_key(find_target(document_id), mode)
+    version = corpus_version(SOURCE_DOCS_PATH)
+    return key, version, reuse_result(document_id, key, version)
+
+def run_local_pipeline(sections: Dict[str, Union[str, Iterable[str]]], parallel: bool = PARALLEL_SECTIONS,
+                       progress: Optional[Callable[[float], None]] = None) -> List[Dict]:
+    """
+    Analyzes each non-empty section, without the LLM round-trip.
+
+    :param sections: Section name to section text, as returned by split_into_sections,
+        or to an iterable of text chunks, as returned by read_section.
+    :param parallel: Run the section analyses concurrently.
+    :param progress: Optional callback receiving the fraction of sections analyzed.
+    :return: One result per analyzed section: name, the analyzer that handles
+        it, target_words and sources, see detect_passages().
+    """
+    tasks = [(name, text) for name, text in sections.items()
+             if not isinstance(text, str) or text.strip()]
+    logger.info(f"Running local pipeline on {len(tasks)} sections (parallel={parallel})")
 
+    done = 0
+    def analyze(task):
+        nonlocal done
+        name, text = task
+        logger.info(f"Analyzing {name} section")
+        result = analyze_section(text)
+        done += 1
+        if progress is not None:
+            progress(done / len(tasks))
+        return dict(result, name=name, analyzer=SECTION_ANALYZERS[name].__name__)
+
+    if parallel and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            # Each section runs in a copy of this context, so it keeps the document's log sampling
+            futures = [executor.submit(copy_context().run, analyze, task) for task in tasks]
+            return [future.result() for future in futures]
+    return [analyze(task) for task in tasks]
+
+def run_agent_pipeline(content: str) -> str:
+    """
+    Sends each non-empty section to its plagiarism agent, all sections
+    concurrently, and collects the tool results.
+
+    :param content: Full document text.
+    :return: The aggregated report.
+    """
+    sections = [(name, text) for name, text in split_into_sections(content).items() if text.strip()]
+    logger.info(f"Running section agents on {len(sections)} sections")
+    client = get_llm_client()
+
+    async def run_agents():
+        return await asyncio.gather(*(run_section_agent(name, text, client) for name, text in sections))
+
+    with timed('llm'):
+        results = client.run(run_agents())
+
+    aggregated_report = ""
+    for tool_results in results:
+        for tool_name, tool_result in tool_results:
+            aggregated_report += f"{tool_name} result:\n{tool_result}\n\n"
+
+    logger.info("Extracted aggregated report from section agent responses")
+    return aggregated_report
+
+def process_document_for_plagiarism(document_id: str, mode: str = PROCESSING_MODE,
+                                    progress: Optional[Callable[[int], None]] = None):
+    """
+    Analyzes an uploaded document and writes its plagiarism report.
+
+    :param document_id: Identifier of the uploaded document.
+    :param mode: "local" or "agent", see PROCESSING_MODE.
+    :param progress: Optional callback receiving the completion percentage.
+    :raises Exception: If the document cannot be read or analyzed, or the report cannot be saved.
+    """
+    def report_progress(percent: int):
+        if progress is not None:
+            progress(percent)
+
+    sample_document(document_id)
+    logger.info(f"Starting plagiarism processing for document ID: {document_id} (mode={mode})")
+    try:
         # Path to the target document
-        target_file_path = os.path.join(REPORTS_PATH, f"{document_id}_target.txt")
-        logger.debug(f"Target file path: {target_file_path}")
+        target_file_path = find_target(document_id)
+        logger.debug("Target file path: %s", target_file_path)
 
-        # Read the target document
+        # Read the target document. The local pipeline streams each section
+        # from disk; only the agent path needs the whole text in memory.
         try:
-            with open(target_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            logger.debug(f"Content length of uploaded document: {len(content)} characters")
-            logger.debug(f"First 100 characters of content: {content[:100]}")
+            if mode == "agent":
+                with open(target_file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                logger.debug("Content length of uploaded document: %d characters", len(content))
+                logger.debug("First 100 characters of content: %s", content[:100])
+            else:
+                section_ranges = find_section_ranges(target_file_path)
             logger.info(f"Successfully read target document: {document_id}")
-            logger.debug(f"Document content length: {len(content)} characters")
+            report_progress(10)
         except FileNotFoundError:
             logger.error(f"Target document {document_id} not found at {target_file_path}")
-            return
+            raise
         except Exception as e:
             logger.exception(f"Unexpected error reading target document {document_id}: {e}")
-            return
+            raise
 
-        # Split document into sections
-        sections = split_into_sections(content)
+        # Identical documents analyzed against the same corpus share a report
+        key, version, cached_from = find_cached_result(document_id, mode)
+        if cached_from is not None:
+            logger.info(f"Plagiarism processing completed for document ID: {document_id} (cached)")
+            return
 
-        # Run the triage_agent to determine sections to analyze
-        logger.info("Running triage agent")
         try:
-            response = swarm.run(
-                agent=triage_agent,
-                messages=[{"role": "user", "content": content}],
-                max_turns=1
-            )
-            logger.debug(f"Triage agent response: {response}")
-            
-            # Extract the report from the response
-            aggregated_report = ""
-            for message in response.messages:
-                if message['role'] == 'tool':
-                    aggregated_report += f"{message['tool_name']} result:\n{message['content']}\n\n"
-            
-            logger.info("Extracted aggregated report from triage agent response")
-            logger.debug(f"Aggregated report:\n{aggregated_report}")
-            
-            # Save the aggregated report to the reports folder
-            report_file_path = os.path.join(REPORTS_PATH, f"{document_id}_report.txt")
-            logger.debug(f"Saving report to: {report_file_path}")
+            if mode == "agent":
+                report = {'mode': mode, 'sections': [], 'text': run_agent_pipeline(content)}
+            else:
+                report = {'mode': mode, 'sections': run_local_pipeline(
+                    {name: read_section(target_file_path, start, end) for name, (start, end) in section_ranges.items()},
+                    progress=lambda fraction: report_progress(10 + int(80 * fraction)),
+                )}
+            report_progress(90)
+
+            # Save the structured report to the report store
             try:
-                with open(report_file_path, 'w', encoding='utf-8') as f:
-                    f.write(aggregated_report)
-                logger.info(f"Plagiarism report saved for document ID: {document_id}")
+                with timed('report_write'):
+                    report_file_path = save_report(document_id, report)
+                logger.info(f"Plagiarism report saved for document ID: {document_id} at {report_file_path}")
+                remember_result(document_id, key, version)
             except Exception as e:
                 logger.exception(f"Error saving plagiarism report for document ID {document_id}: {e}")
+                raise
 
             logger.info(f"Plagiarism processing completed for document ID: {document_id}")
         except Exception as e:
-            logger.exception(f"Error running triage_agent: {e}")
-            return
+            logger.exception(f"Error running {mode} pipeline: {e}")
+            raise
     except Exception as e:
         logger.exception(f"Error processing document {document_id}: {e}")
         raise
 
 if __name__ == "__main__":
+    setup_logging()
     logger.info("Document processor module run directly")
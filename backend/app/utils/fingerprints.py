@@ -0,0 +1,216 @@
+import os
+import hashlib
+import string
+from array import array
+from collections import deque
+from functools import lru_cache
+from typing import IO, Iterable, Iterator, List, Tuple
+
+# Shared fingerprinting used by ingestion (writer) and detection (reader).
+# Bump FINGERPRINT_VERSION whenever tokenization, hashing or the on-disk layout
+# in database/fingerprint_store.py changes, so stale fingerprint files are
+# ignored instead of silently producing wrong matches.
+FINGERPRINT_VERSION = 5
+DEFAULT_NGRAM_SIZE = 5
+NORMALIZATION = "lower-strip-punct"
+
+# Fingerprint selection: a window of 1 keeps every n-gram hash; a larger window
+# winnows the source fingerprints (see winnow()), trading index size for a
+# minimum guaranteed match length of window + n - 1 words.
+FINGERPRINT_WINDOW = int(os.getenv('FINGERPRINT_WINDOW', 1))
+
+# Polynomial rolling hash modulo 2**64 over 64-bit token hashes.
+HASH_BASE = 0x100000001B3
+HASH_MASK = (1 << 64) - 1
+TOKEN_HASH_CACHE_SIZE = 1 << 18
+
+# Size, in characters, of the chunks streamed documents are read in.
+TEXT_CHUNK_SIZE = int(os.getenv('TEXT_CHUNK_SIZE', 1 << 20))
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+def preprocess_text(text: str) -> List[str]:
+    """
+    Normalizes text into words: lowercases, strips punctuation and splits on whitespace.
+
+    :param text: The text to preprocess.
+    :return: List of words.
+    """
+    return text.lower().translate(_PUNCTUATION_TABLE).split()
+
+def iter_words(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Streaming counterpart of preprocess_text() over a text split into arbitrary chunks.
+
+    A word cut by a chunk boundary is carried over and completed by the next
+    chunk, so the words produced equal preprocess_text() of the joined text
+    while only one chunk is held in memory.
+
+    :param chunks: Iterable of text chunks, e.g. from read_chunks().
+    :return: Iterator of normalized words.
+    """
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk.lower().translate(_PUNCTUATION_TABLE)
+        words = text.split()
+        carry = words.pop() if words and not text[-1].isspace() else ""
+        yield from words
+    if carry:
+        yield carry
+
+def read_chunks(f: IO[str], chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Reads an open text file in chunks of ``chunk_size`` characters.
+
+    :param f: File opened in text mode.
+    :param chunk_size: Number of characters per chunk.
+    :return: Iterator of text chunks.
+    """
+    return iter(lambda: f.read(chunk_size), "")
+
+def generate_ngrams(words: List[str], n: int) -> List[Tuple[str, int]]:
+    """
+    Generates n-grams from a list of words.
+
+    :param words: List of words.
+    :param n: Size of the n-gram.
+    :return: List of tuples containing n-gram and its position.
+    """
+    return [(" ".join(words[i:i+n]), i) for i in range(len(words) - n + 1)]
+
+@lru_cache(maxsize=TOKEN_HASH_CACHE_SIZE)
+def token_hash(word: str) -> int:
+    """
+    Maps a word to a stable 64-bit value, the "character" of the rolling hash.
+
+    :param word: A normalized word.
+    :return: 64-bit token hash.
+    """
+    return int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def rolling_hashes(words: Iterable[str], n: int) -> Iterator[Tuple[int, int]]:
+    """
+    Rabin-Karp rolling hash over word tokens.
+
+    Each window hash is updated in constant time as the window slides: the
+    outgoing token is removed, the rest shifted by one base power and the
+    incoming token added, all modulo 2**64. No n-gram strings are built.
+
+    :param words: Iterable of words.
+    :param n: Size of the n-grams.
+    :return: Iterator of (hash, position) tuples in document order.
+    """
+    return rolling_token_hashes(map(token_hash, words), n)
+
+def rolling_token_hashes(tokens: Iterable[int], n: int) -> Iterator[Tuple[int, int]]:
+    """
+    rolling_hashes() over words already mapped to their token hashes.
+
+    :param tokens: Iterable of token hashes, see token_hash().
+    :param n: Size of the n-grams.
+    :return: Iterator of (hash, position) tuples in document order.
+    """
+    power = pow(HASH_BASE, n - 1, HASH_MASK + 1)
+    window = deque()
+    h = 0
+    for i, t in enumerate(tokens):
+        if len(window) == n:
+            h = (h - window.popleft() * power) & HASH_MASK
+        window.append(t)
+        h = (h * HASH_BASE + t) & HASH_MASK
+        if len(window) == n:
+            yield h, i - n + 1
+
+def compute_hash(ngram: str) -> int:
+    """
+    Computes the 64-bit hash of an n-gram string, equal to the rolling hash of its window.
+
+    :param ngram: The n-gram string.
+    :return: Hash value.
+    """
+    h = 0
+    for word in ngram.split():
+        h = (h * HASH_BASE + token_hash(word)) & HASH_MASK
+    return h
+
+def winnow(fingerprints: List[Tuple[int, int]], window: int) -> List[Tuple[int, int]]:
+    """
+    Selects a subset of fingerprints by winnowing (Schleimer, Wilkerson and Aiken, 2003).
+
+    In every run of ``window`` consecutive n-gram hashes the minimum (rightmost
+    on ties) is kept, and each selected hash is recorded once. Any passage of at
+    least window + n - 1 words shared with a source therefore contains at least
+    one selected source fingerprint, while only about 2 / (window + 1) of the
+    hashes are stored.
+
+    :param fingerprints: List of (hash, position) tuples in document order.
+    :param window: Winnowing window, in n-grams. 1 keeps every fingerprint.
+    :return: The selected (hash, position) tuples in document order.
+    """
+    if window <= 1:
+        return list(fingerprints)
+    if len(fingerprints) < window:
+        # Shorter than one window: keep the single minimum so the document is still indexed.
+        return [min(reversed(fingerprints), key=lambda fp: fp[0])] if fingerprints else []
+
+    selected = []
+    minima = deque()
+    last = -1
+    for i, (h, _) in enumerate(fingerprints):
+        while minima and fingerprints[minima[-1]][0] >= h:
+            minima.pop()
+        minima.append(i)
+        if minima[0] <= i - window:
+            minima.popleft()
+        if i >= window - 1 and minima[0] != last:
+            last = minima[0]
+            selected.append(fingerprints[last])
+    return selected
+
+def shard_of(h: int, shards: int) -> int:
+    """
+    Returns the shard a hash belongs to when the hash space is split into
+    ``shards`` equal ranges; for a power of two this is the hash's top bits.
+
+    :param h: 64-bit hash value.
+    :param shards: Number of shards.
+    :return: Shard number, 0 to shards - 1.
+    """
+    return (h * shards) >> 64
+
+def shard_bounds(shards: int) -> List[int]:
+    """
+    Returns the lowest hash of every shard after the first, for vectorized
+    shard assignment with a sorted search; consistent with shard_of().
+
+    :param shards: Number of shards.
+    :return: List of shards - 1 ascending hash values.
+    """
+    return [-(-(shard << 64) // shards) for shard in range(1, shards)]
+
+def fingerprint_words(words: Iterable[str], n: int = DEFAULT_NGRAM_SIZE,
+                      window: int = FINGERPRINT_WINDOW) -> Tuple[array, List[Tuple[int, int]]]:
+    """
+    Maps words to their token IDs and fingerprints them.
+
+    The token IDs are stored with the fingerprints, so detection can verify
+    and extend hits without reading the source text again.
+
+    :param words: Iterable of normalized words.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window; 1 keeps every n-gram.
+    :return: (token IDs as a uint64 array, list of (hash, position) tuples in document order).
+    """
+    tokens = array('Q', map(token_hash, words))
+    return tokens, winnow(list(rolling_token_hashes(tokens, n)), window)
+
+def fingerprint_text(text: str, n: int = DEFAULT_NGRAM_SIZE, window: int = FINGERPRINT_WINDOW) -> List[Tuple[int, int]]:
+    """
+    Computes the (hash, position) fingerprints of a text.
+
+    :param text: The text to fingerprint.
+    :param n: Size of the n-grams.
+    :param window: Winnowing window; 1 keeps every n-gram.
+    :return: List of (hash, position) tuples in document order.
+    """
+    return winnow(list(rolling_hashes(preprocess_text(text), n)), window)
@@ -1,17 +1,93 @@
-import logging
 import os
+import queue
+import atexit
+import logging
+import multiprocessing
+import multiprocessing.util
+import zlib
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Single logging setup for the application.
+#
+# Records are put on an in-memory queue by a QueueHandler and written to the
+# log file and stderr by a QueueListener thread, so a slow disk never blocks
+# detection. Detailed per-document logging on the hot path is sampled: for
+# LOG_SAMPLE_RATE of the documents, chosen by document ID, debug_sampled()
+# is true and the detection code logs its per-block and per-source details at
+# DEBUG; all other documents only get their summary lines.
+#
+# Importing this module configures nothing. Entry points (the API lifespan,
+# the scripts) and pool initializers call setup_logging(): every process
+# needs its own writer thread, since a forked child inherits the parent's
+# QueueHandler but not the thread draining its queue.
+
+LOG_FILE = os.getenv('LOG_FILE', os.path.join(os.path.dirname(__file__), '..', '..', '..', 'logs', 'app.log'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))  # Fraction of documents logged in detail
+
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+_sampled: ContextVar[bool] = ContextVar('log_sampled', default=False)
+
+def setup_logging() -> logging.Logger:
+    """
+    Routes all log records through a queue to a background writer thread.
+
+    Safe to call more than once; only the first call in each process configures logging.
 
-def setup_logging():
-    log_file = os.getenv('LOG_FILE', 'E:/Github/swarm-openai/app.log')
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    :return: The application logger.
+    """
+    global _listener, _listener_pid
+    if _listener_pid != os.getpid():
+        handlers = [logging.StreamHandler()]
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(LOG_FILE)), exist_ok=True)
+            handlers.insert(0, logging.FileHandler(LOG_FILE, encoding='utf-8'))
+        except OSError as e:
+            print(f"Cannot open log file {LOG_FILE}: {e}; logging to stderr only")
+        formatter = logging.Formatter(LOG_FORMAT)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+        if multiprocessing.parent_process() is None:
+            atexit.register(_listener.stop)
+        else:
+            # Child processes exit without running atexit handlers
+            multiprocessing.util.Finalize(None, _listener.stop, exitpriority=0)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(QueueHandler(log_queue))
+        root.setLevel(LOG_LEVEL)
     return logging.getLogger(__name__)
 
-# Create a logger instance
-logger = setup_logging()
+def sample_document(document_id: str, rate: float = LOG_SAMPLE_RATE) -> bool:
+    """
+    Decides whether a document is logged in detail; the choice is stable per document ID.
+
+    Sets the decision for the current context (thread or task), see debug_sampled().
+
+    :param document_id: Identifier of the document.
+    :param rate: Fraction of documents to sample, 0-1.
+    :return: True if the document is sampled.
+    """
+    sampled = zlib.crc32(document_id.encode('utf-8')) < rate * 2 ** 32
+    _sampled.set(sampled)
+    return sampled
+
+def debug_sampled() -> bool:
+    """
+    Returns True when the current document is sampled and DEBUG logging is enabled.
+    """
+    return _sampled.get() and logger.isEnabledFor(logging.DEBUG)
+
+# Application logger; records are only written once setup_logging() has run
+logger = logging.getLogger(__name__)
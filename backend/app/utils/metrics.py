@@ -0,0 +1,229 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Process-local metrics in the Prometheus data model.
+#
+# Every process records into its own registry. Worker processes periodically
+# drain() their registry (counters and histograms as deltas, gauges as
+# current values) and ship the snapshot to the API process, which merge()s it
+# into its own registry and render()s everything on /metrics in the
+# Prometheus text format. No client library is needed.
+#
+# Hot-path code wraps each stage in timed(stage). Inside a stopwatch() (one
+# per analyzed document section) the stage times are summed and observed once
+# when the stopwatch ends, so the stage histograms describe per-document
+# latency rather than per-block latency.
+
+# Bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        with _registry_lock:
+            _registry[name] = self
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def drain(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], float]):
+        for labelvalues, amount in values.items():
+            self.inc(*labelvalues, amount=amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}_total{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in values
+        ]
+
+class Gauge(_Metric):
+    """Value that can go up and down; merging keeps the latest value."""
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = float(value)
+
+    def drain(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: Dict[Tuple[str, ...], float]):
+        with self._lock:
+            self._values.update(values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in values
+        ]
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def drain(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], list]):
+        with self._lock:
+            for labelvalues, (counts, total, count) in values.items():
+                state = self._values.get(labelvalues)
+                if state is None:
+                    state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((labelvalues, [list(state[0]), state[1], state[2]]) for labelvalues, state in self._values.items())
+        lines = self._header()
+        for labelvalues, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else _format_value(bound)
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+def drain() -> Dict[str, dict]:
+    """
+    Takes everything recorded in this process since the last drain, for merge() in another process.
+
+    :return: Metric name to its values: counter and histogram deltas, current gauge values.
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    snapshot = {}
+    for metric in metrics:
+        values = metric.drain()
+        if values:
+            snapshot[metric.name] = values
+    return snapshot
+
+def merge(snapshot: Dict[str, dict]):
+    """
+    Adds a snapshot taken by drain() in another process to this process's metrics.
+
+    :param snapshot: Metric name to values.
+    """
+    for name, values in snapshot.items():
+        metric = _registry.get(name)
+        if metric is not None:
+            metric.merge(values)
+
+def render() -> str:
+    """
+    Renders every metric of this process in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Metrics shared across modules
+STAGE_SECONDS = Histogram(
+    "plagiarism_stage_seconds",
+    "Time spent per document section in each processing stage.",
+    ("stage",),
+)
+JOB_SECONDS = Histogram("plagiarism_job_seconds", "Time from claiming a job to its completion or failure.", ("outcome",))
+CACHE_REQUESTS = Counter("plagiarism_cache_requests", "Cache lookups by cache and result.", ("cache", "result"))
+INDEX_FINGERPRINTS = Gauge("plagiarism_index_fingerprints", "Source fingerprints held by the local detection index.", ("n",))
+
+_stopwatch: ContextVar[Optional[Dict[str, float]]] = ContextVar('stopwatch', default=None)
+
+@contextmanager
+def stopwatch() -> Iterator[Dict[str, float]]:
+    """
+    Sums the timed() stages run inside the block and observes each total once at the end.
+
+    :return: Stage name to seconds spent so far.
+    """
+    totals: Dict[str, float] = {}
+    token = _stopwatch.set(totals)
+    try:
+        yield totals
+    finally:
+        _stopwatch.reset(token)
+        for stage, seconds in totals.items():
+            STAGE_SECONDS.observe(seconds, stage)
+
+@contextmanager
+def timed(stage: str):
+    """
+    Times a processing stage, adding to the current stopwatch() if there is one.
+
+    :param stage: Name of the stage, the "stage" label of plagiarism_stage_seconds.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        totals = _stopwatch.get()
+        if totals is None:
+            STAGE_SECONDS.observe(seconds, stage)
+        else:
+            totals[stage] = totals.get(stage, 0.0) + seconds
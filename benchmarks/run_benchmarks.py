@@ -0,0 +1,392 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+# Add the project root directory to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks.synthetic_corpus import MANIFEST_NAME, generate_corpus
+from backend.app.agents.rabin_karp import DETECTION_ENGINE, DETECTION_ENGINES
+from backend.app.utils.fingerprints import DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW
+from backend.app.utils.logging_config import logger, setup_logging
+
+# Benchmark harness.
+#
+# Generates (or reuses) a synthetic corpus, then runs each phase in a fresh
+# process so its peak RSS is its own:
+#
+#   ingest  ingest_corpus() over the sources: throughput and index size
+#   detect  rabin_karp_plagiarism() and per-section detect_passages() over
+#           every target: latency percentiles and recall of the planted passages
+#   api     a uvicorn server fed through /upload, followed over /events until
+#           the report is fetched: end-to-end latency and throughput
+#
+# Results are written as JSON, so runs can be compared across commits.
+
+PHASES = ("ingest", "detect", "api")
+# A planted passage counts as found when this fraction of it is covered by reported passages
+RECALL_COVERAGE = 0.9
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """
+    Summarizes a latency sample.
+
+    :param values: Latencies in seconds.
+    :return: count, mean, p50, p90, p99 and max.
+    """
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {'count': len(ordered), 'mean': sum(ordered) / len(ordered),
+            'p50': at(0.50), 'p90': at(0.90), 'p99': at(0.99), 'max': ordered[-1]}
+
+def index_size(source_dir: str) -> Dict[str, int]:
+    """
+    Measures the on-disk size of a source directory's fingerprints.
+
+    :param source_dir: The source documents directory.
+    :return: Bytes of corpus segments (with the manifest) and of per-document fingerprint files.
+    """
+    from backend.app.database.fingerprint_store import FINGERPRINT_FILE_SUFFIX, INDEX_DIR_NAME
+
+    sizes = {'segment_bytes': 0, 'fingerprint_file_bytes': 0}
+    index_dir = os.path.join(source_dir, INDEX_DIR_NAME)
+    if os.path.isdir(index_dir):
+        with os.scandir(index_dir) as entries:
+            sizes['segment_bytes'] = sum(entry.stat().st_size for entry in entries if entry.is_file())
+    with os.scandir(source_dir) as entries:
+        sizes['fingerprint_file_bytes'] = sum(
+            entry.stat().st_size for entry in entries if entry.name.endswith(FINGERPRINT_FILE_SUFFIX)
+        )
+    return sizes
+
+def _peak_rss() -> Dict[str, float]:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1048576,
+        'peak_child_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1048576,
+    }
+
+def bench_ingest(source_dir: str, n: int, window: int, workers: int) -> Dict:
+    """
+    Ingests the corpus from scratch.
+    """
+    from backend.app.database.file_ingest import ingest_corpus
+    from backend.app.database.fingerprint_store import FINGERPRINT_FILE_SUFFIX, INDEX_DIR_NAME
+
+    shutil.rmtree(os.path.join(source_dir, INDEX_DIR_NAME), ignore_errors=True)
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(FINGERPRINT_FILE_SUFFIX):
+                os.remove(entry.path)
+
+    stats = ingest_corpus(source_dir, n, window, workers)
+    rerun = ingest_corpus(source_dir, n, window, workers)
+    return {
+        'documents': stats['ingested'],
+        'failed': stats['failed'],
+        'bytes': stats['bytes'],
+        'seconds': stats['seconds'],
+        'docs_per_second': stats['docs_per_second'],
+        'mb_per_second': stats['mb_per_second'],
+        'incremental_rerun_seconds': rerun['seconds'],
+        **index_size(source_dir),
+    }
+
+def _planted_recall(planted: List[Dict], sections: Dict[str, Dict]) -> Dict[str, int]:
+    found = covered_words = planted_words = 0
+    for passage in planted:
+        length = passage['target_end'] - passage['target_start']
+        covered = 0
+        for source in sections.get(passage['section'], {}).get('sources', ()):
+            if source['source_document'] != passage['source_document']:
+                continue
+            for reported in source['passages']:
+                covered += max(0, min(reported['target_end'], passage['target_end'])
+                               - max(reported['target_start'], passage['target_start']))
+        covered = min(covered, length)
+        planted_words += length
+        covered_words += covered
+        found += covered >= RECALL_COVERAGE * length
+
+    unplanned = 0
+    for section, result in sections.items():
+        spans = [(p['target_start'], p['target_end']) for p in planted if p['section'] == section]
+        for source in result['sources']:
+            for reported in source['passages']:
+                if not any(start < reported['target_end'] and reported['target_start'] < end for start, end in spans):
+                    unplanned += 1
+    return {'planted': len(planted), 'found': found, 'planted_words': planted_words,
+            'covered_words': covered_words, 'unplanned_passages': unplanned}
+
+def bench_detect(corpus_dir: str, n: int, window: int, engine: str, workers: int) -> Dict:
+    """
+    Runs rabin_karp_plagiarism() on every target, then detect_passages() on
+    every target section, and checks the passages against the ground truth.
+    """
+    from backend.app.agents.rabin_karp import detect_passages, get_source_index, rabin_karp_plagiarism
+    from backend.app.processors.document_processor import find_section_ranges, read_section
+
+    with open(os.path.join(corpus_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        ground_truth = json.load(f)
+
+    started = time.perf_counter()
+    index = get_source_index(n, window)
+    index_load_seconds = time.perf_counter() - started
+
+    ngram_latencies, passage_latencies = [], []
+    totals = {'planted': 0, 'found': 0, 'planted_words': 0, 'covered_words': 0, 'unplanned_passages': 0}
+    target_words = target_bytes = 0
+    started = time.perf_counter()
+    for name, planted in ground_truth['targets'].items():
+        path = os.path.join(corpus_dir, "targets", name)
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        target_bytes += os.path.getsize(path)
+
+        t0 = time.perf_counter()
+        rabin_karp_plagiarism(text, n, engine=engine, window=window)
+        ngram_latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        sections = {
+            section: detect_passages(read_section(path, start, end), n, engine=engine, window=window, workers=workers)
+            for section, (start, end) in find_section_ranges(path).items()
+        }
+        passage_latencies.append(time.perf_counter() - t0)
+
+        target_words += sum(result['target_words'] for result in sections.values())
+        for key, value in _planted_recall(planted, sections).items():
+            totals[key] += value
+    seconds = time.perf_counter() - started
+
+    targets = len(ground_truth['targets'])
+    return {
+        'engine': engine,
+        'workers': workers,
+        'source_fingerprints': len(index),
+        'index_load_seconds': index_load_seconds,
+        'targets': targets,
+        'target_words': target_words,
+        'seconds': seconds,
+        'targets_per_second': targets / seconds if seconds else 0.0,
+        'mb_per_second': target_bytes / 1048576 / sum(passage_latencies) if sum(passage_latencies) else 0.0,
+        'rabin_karp_plagiarism_latency': percentiles(ngram_latencies),
+        'detect_passages_latency': percentiles(passage_latencies),
+        'recall': totals['found'] / totals['planted'] if totals['planted'] else None,
+        'word_recall': totals['covered_words'] / totals['planted_words'] if totals['planted_words'] else None,
+        **totals,
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+def _upload_and_wait(base_url: str, path: str) -> Dict:
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = requests.post(f"{base_url}/upload", files={'file': (os.path.basename(path), f, 'text/plain')})
+    response.raise_for_status()
+    document_id = response.json()['document_id']
+    uploaded = time.perf_counter()
+
+    status = None
+    with requests.get(f"{base_url}/events/{document_id}", stream=True) as events:
+        events.raise_for_status()
+        for line in events.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                status = json.loads(line[len("data:"):])
+                if status['status'] in ("completed", "failed"):
+                    break
+    report = requests.get(f"{base_url}/report/{document_id}")
+    report.raise_for_status()
+    return {'status': status['status'] if status else None, 'upload_seconds': uploaded - started,
+            'seconds': time.perf_counter() - started}
+
+def bench_api(corpus_dir: str, concurrency: int, job_workers: int, startup_timeout: float = 300) -> Dict:
+    """
+    Starts the API on a scratch reports directory and pushes every target through /upload.
+    """
+    workdir = tempfile.mkdtemp(prefix="plagiarism-bench-")
+    with open(os.path.join(corpus_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        targets = [os.path.join(corpus_dir, "targets", name) for name in json.load(f)['targets']]
+    port = _free_port()
+    base_url = f"http://localhost:{port}"
+    env = dict(
+        os.environ,
+        SOURCE_DOCS_PATH=os.path.join(corpus_dir, "sources"),
+        REPORTS_PATH=os.path.join(workdir, "reports"),
+        JOBS_DB_PATH=os.path.join(workdir, "jobs.db"),
+        RESULT_CACHE_PATH=os.path.join(workdir, "results.db"),
+        RESULT_CACHE_SIZE="0",  # measure the work, not the cache
+        JOB_WORKERS=str(job_workers),
+        MAX_QUEUE_DEPTH=str(max(1000, len(targets))),
+        PROCESSING_MODE="local",
+        LOG_FILE=os.path.join(workdir, "app.log"),
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"API server exited with code {server.returncode}; see {env['LOG_FILE']}")
+            try:
+                # Ready once every worker has loaded the source index
+                ready = requests.get(f"{base_url}/ready", timeout=1)
+                if ready.status_code == 200:
+                    break
+                if ready.json().get('error'):
+                    raise RuntimeError(f"API server warm-up failed: {ready.json()['error']}")
+            except requests.ConnectionError:
+                pass
+            if time.perf_counter() - started > startup_timeout:
+                raise RuntimeError("API server did not start in time")
+            time.sleep(0.1)
+        startup_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda path: _upload_and_wait(base_url, path), targets))
+        seconds = time.perf_counter() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'concurrency': concurrency,
+        'job_workers': job_workers,
+        'startup_seconds': startup_seconds,
+        'documents': len(results),
+        'failed': sum(result['status'] != "completed" for result in results),
+        'seconds': seconds,
+        'docs_per_second': len(results) / seconds if seconds else 0.0,
+        'upload_latency': percentiles([result['upload_seconds'] for result in results]),
+        'end_to_end_latency': percentiles([result['seconds'] for result in results]),
+    }
+
+def _run_phase(phase: str, kwargs: Dict, quiet: bool) -> Dict:
+    # Runs inside a fresh process, see run_phase().
+    setup_logging()
+    if quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    result = {'ingest': bench_ingest, 'detect': bench_detect, 'api': bench_api}[phase](**kwargs)
+    result.update(_peak_rss())
+    return result
+
+def run_phase(phase: str, quiet: bool = True, **kwargs) -> Dict:
+    """
+    Runs one benchmark phase in a fresh process and returns its measurements.
+
+    :param phase: "ingest", "detect" or "api".
+    :param quiet: Only log warnings while the phase runs.
+    :param kwargs: Arguments of the phase function.
+    :return: The phase's measurements, with peak_rss_mb of the phase process and
+        peak_child_rss_mb of the largest process it started.
+    """
+    logger.info(f"Running benchmark phase {phase}")
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_run_phase, phase, kwargs, quiet).result()
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, detection and the upload-to-report path.")
+    parser.add_argument('--corpus-dir', default=None, help="Corpus directory; reused if it exists. Defaults to a temporary directory.")
+    parser.add_argument('--sources', type=int, default=1000, help="Number of source documents (10 to 1M).")
+    parser.add_argument('--targets', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=0.3, help="Fraction of target words copied from sources.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source-words', type=int, default=500)
+    parser.add_argument('--section-words', type=int, default=400)
+    parser.add_argument('--phases', default=",".join(PHASES), help=f"Comma-separated subset of {', '.join(PHASES)}.")
+    parser.add_argument('--ngram-size', type=int, default=DEFAULT_NGRAM_SIZE)
+    parser.add_argument('--window', type=int, default=FINGERPRINT_WINDOW)
+    parser.add_argument('--engine', default=DETECTION_ENGINE, choices=sorted(DETECTION_ENGINES))
+    parser.add_argument('--ingest-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--detection-workers', type=int, default=1)
+    parser.add_argument('--api-concurrency', type=int, default=4, help="Documents in flight against the API.")
+    parser.add_argument('--job-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default=None, help="JSON output file; printed to stdout when omitted.")
+    parser.add_argument('--verbose', action='store_true', help="Keep INFO logging during the phases.")
+    args = parser.parse_args()
+
+    phases = [phase.strip() for phase in args.phases.split(',') if phase.strip()]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"Unknown phases: {', '.join(sorted(unknown))}")
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="plagiarism-corpus-")
+    started = time.perf_counter()
+    ground_truth = generate_corpus(corpus_dir, args.sources, args.targets, args.rate, args.seed,
+                                   args.source_words, args.section_words)
+    source_dir = os.path.join(corpus_dir, "sources")
+    # Phase processes and the API server resolve the corpus through SOURCE_DOCS_PATH.
+    os.environ['SOURCE_DOCS_PATH'] = source_dir
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_commit': _git_commit(),
+            'timestamp': time.time(),
+        },
+        'corpus': dict(ground_truth['config'], copied_fraction=ground_truth['copied_fraction'], path=corpus_dir,
+                       generation_seconds=time.perf_counter() - started),
+        'results': {},
+    }
+    quiet = not args.verbose
+    if "ingest" in phases:
+        results['results']['ingest'] = run_phase("ingest", quiet, source_dir=source_dir, n=args.ngram_size,
+                                                 window=args.window, workers=args.ingest_workers)
+    if "detect" in phases:
+        results['results']['detect'] = run_phase("detect", quiet, corpus_dir=corpus_dir, n=args.ngram_size,
+                                                 window=args.window, engine=args.engine,
+                                                 workers=args.detection_workers)
+    if "api" in phases:
+        results['results']['api'] = run_phase("api", quiet, corpus_dir=corpus_dir,
+                                              concurrency=args.api_concurrency, job_workers=args.job_workers)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        logger.info(f"Benchmark results written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.utils.logging_config import logger, setup_logging
+
+# Synthetic corpora for the benchmarks.
+#
+# Words are drawn from a generated vocabulary with a Zipf-like frequency
+# distribution. Every source document is generated from its own seed, so a
+# copied passage can be regenerated without keeping the corpus in memory and
+# corpora of a million documents are written in one streaming pass. Targets
+# have Introduction, Body and Conclusion sections in which about ``rate`` of
+# the words are passages copied from random source documents; the planted
+# passages are recorded in ground_truth.json, with positions counted in
+# normalized section words like detect_passages() reports them.
+
+SECTION_NAMES = ("Introduction", "Body", "Conclusion")
+WORDS_PER_LINE = 16
+MANIFEST_NAME = "ground_truth.json"
+
+def build_vocabulary(size: int, seed: int) -> np.ndarray:
+    """
+    Generates a vocabulary of distinct lowercase pseudo-words.
+
+    Words that could be mistaken for a section header are left out.
+
+    :param size: Number of words.
+    :param seed: Random seed.
+    :return: Array of words.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words, seen = [], set()
+    while len(words) < size:
+        length = int(rng.integers(3, 11))
+        word = "".join(letters[rng.integers(0, 26, length)])
+        if word in seen or word.startswith(tuple(name.lower() for name in SECTION_NAMES)):
+            continue
+        seen.add(word)
+        words.append(word)
+    return np.array(words)
+
+class CorpusGenerator:
+    """
+    Deterministic generator of source documents and plagiarized targets.
+    """
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 50000, zipf_exponent: float = 0.9,
+                 source_words: int = 500):
+        self.seed = seed
+        self.source_words = source_words
+        self.vocabulary = build_vocabulary(vocabulary_size, seed)
+        weights = 1.0 / np.arange(10, vocabulary_size + 10) ** zipf_exponent
+        self._cumulative = np.cumsum(weights / weights.sum())
+
+    def _draw(self, rng: np.random.Generator, count: int) -> List[str]:
+        indexes = np.minimum(np.searchsorted(self._cumulative, rng.random(count)), len(self.vocabulary) - 1)
+        return self.vocabulary[indexes].tolist()
+
+    def source_name(self, index: int) -> str:
+        return f"src{index:07d}.txt"
+
+    def source_document(self, index: int) -> List[str]:
+        """
+        Returns the words of a source document; the same index always gives the same words.
+
+        :param index: Number of the source document.
+        """
+        rng = np.random.default_rng((self.seed, 1, index))
+        length = int(rng.integers(self.source_words // 2, self.source_words * 3 // 2 + 1))
+        return self._draw(rng, length)
+
+    def target_document(self, index: int, sources: int, section_words: int, rate: float,
+                        passage_words: Tuple[int, int]) -> Tuple[Dict[str, List[str]], List[Dict]]:
+        """
+        Generates a target document with copied passages.
+
+        :param index: Number of the target document.
+        :param sources: Number of source documents passages are copied from.
+        :param section_words: Approximate number of words per section.
+        :param rate: Fraction of the words copied from sources, 0-1.
+        :param passage_words: (minimum, maximum) length of a copied passage in words.
+        :return: Section name to words, and the planted passages.
+        """
+        rng = np.random.default_rng((self.seed, 2, index))
+        # Fresh text and copied passages alternate; fresh runs are sized so
+        # copied words make up about ``rate`` of the section.
+        mean_fresh = (passage_words[0] + passage_words[1]) / 2 * (1 - rate) / rate if rate > 0 else None
+        sections, planted = {}, []
+        for name in SECTION_NAMES:
+            words: List[str] = []
+            while len(words) < section_words:
+                fresh = section_words if mean_fresh is None else int(rng.exponential(mean_fresh))
+                words.extend(self._draw(rng, min(fresh, section_words - len(words))))
+                if mean_fresh is None or len(words) >= section_words:
+                    break
+                source = int(rng.integers(0, sources))
+                source_words = self.source_document(source)
+                length = min(int(rng.integers(passage_words[0], passage_words[1] + 1)),
+                             max(passage_words[0], section_words - len(words)), len(source_words))
+                start = int(rng.integers(0, len(source_words) - length + 1))
+                planted.append({
+                    'section': name, 'target_start': len(words), 'target_end': len(words) + length,
+                    'source_document': self.source_name(source), 'source_start': start,
+                })
+                words.extend(source_words[start:start + length])
+            sections[name] = words
+        return sections, planted
+
+def _format_lines(words: List[str]) -> str:
+    lines = []
+    for start in range(0, len(words), WORDS_PER_LINE):
+        line = words[start:start + WORDS_PER_LINE]
+        lines.append(" ".join([line[0].capitalize()] + line[1:]) + ".")
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(output_dir: str, sources: int, targets: int, rate: float = 0.3, seed: int = 0,
+                    source_words: int = 500, section_words: int = 400, passage_words: Tuple[int, int] = (20, 80),
+                    vocabulary_size: int = 50000) -> Dict:
+    """
+    Writes a synthetic corpus: output_dir/sources, output_dir/targets and the ground truth.
+
+    Source documents left by a run with the same seed, vocabulary and
+    document length are kept, so a large corpus can be grown or reused.
+
+    :param output_dir: Directory to write to.
+    :param sources: Number of source documents.
+    :param targets: Number of target documents.
+    :param rate: Fraction of target words copied from sources.
+    :param seed: Random seed.
+    :param source_words: Average length of a source document in words.
+    :param section_words: Approximate length of a target section in words.
+    :param passage_words: (minimum, maximum) length of a copied passage.
+    :param vocabulary_size: Number of distinct words.
+    :return: The ground truth: configuration and planted passages per target.
+    """
+    generator = CorpusGenerator(seed, vocabulary_size, source_words=source_words)
+    source_dir = os.path.join(output_dir, "sources")
+    target_dir = os.path.join(output_dir, "targets")
+    os.makedirs(source_dir, exist_ok=True)
+    os.makedirs(target_dir, exist_ok=True)
+
+    source_config = {'seed': seed, 'vocabulary_size': vocabulary_size, 'source_words': source_words}
+    config_path = os.path.join(output_dir, "sources.json")
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            reuse = json.load(f) == source_config
+    except (OSError, ValueError):
+        reuse = False
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(source_config, f)
+
+    for index in range(sources):
+        path = os.path.join(source_dir, generator.source_name(index))
+        if not reuse or not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(_format_lines(generator.source_document(index)))
+        if index and index % 100000 == 0:
+            logger.info(f"Generated {index} of {sources} source documents")
+
+    planted_passages, copied_words, total_words = {}, 0, 0
+    for index in range(targets):
+        sections, planted = generator.target_document(index, sources, section_words, rate, passage_words)
+        name = f"target{index:05d}.txt"
+        with open(os.path.join(target_dir, name), 'w', encoding='utf-8') as f:
+            for section, words in sections.items():
+                f.write(f"{section}\n{_format_lines(words)}")
+        planted_passages[name] = planted
+        copied_words += sum(passage['target_end'] - passage['target_start'] for passage in planted)
+        total_words += sum(len(words) for words in sections.values())
+
+    ground_truth = {
+        'config': {'sources': sources, 'targets': targets, 'rate': rate, 'seed': seed, 'source_words': source_words,
+                   'section_words': section_words, 'passage_words': list(passage_words),
+                   'vocabulary_size': vocabulary_size},
+        'copied_fraction': copied_words / total_words if total_words else 0.0,
+        'targets': planted_passages,
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(ground_truth, f)
+    logger.info(f"Synthetic corpus with {sources} sources and {targets} targets written to {output_dir}")
+    return ground_truth
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Generate a synthetic source corpus and plagiarized targets.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--sources', type=int, default=1000)
+    parser.add_argument('--targets', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=0.3, help="Fraction of target words copied from sources.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source-words', type=int, default=500)
+    parser.add_argument('--section-words', type=int, default=400)
+    args = parser.parse_args()
+    generate_corpus(args.output_dir, args.sources, args.targets, args.rate, args.seed,
+                    args.source_words, args.section_words)
+
+if __name__ == "__main__":
+    main()
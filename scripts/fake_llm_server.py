@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Minimal stand-in for the OpenAI chat completions endpoint, for exercising
+# the agent path without an API key or quota. Every request is answered,
+# after --latency seconds, with a call of its first tool whose first
+# parameter is the user message, the way the section agents call their
+# analyzer. --failure-rate of the requests fail with 429 or 500 to exercise
+# retries, --malformed-rate of the tool calls carry arguments that are
+# not valid JSON and --wrong-argument-rate name a parameter the tool does
+# not have. GET /stats reports request counts and the peak number of
+# concurrent requests.
+
+def create_app(latency: float = 0.5, failure_rate: float = 0.0, malformed_rate: float = 0.0,
+               wrong_argument_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    stats = {'requests': 0, 'failures': 0, 'in_flight': 0, 'peak_in_flight': 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats['requests'] += 1
+        stats['in_flight'] += 1
+        stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+        try:
+            await asyncio.sleep(latency)
+            if random.random() < failure_rate:
+                stats['failures'] += 1
+                if random.random() < 0.5:
+                    return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests"}},
+                                        status_code=429, headers={"retry-after": "0.1"})
+                return JSONResponse({"error": {"message": "Server error", "type": "server_error"}}, status_code=500)
+        finally:
+            stats['in_flight'] -= 1
+
+        user_text = next((message['content'] for message in reversed(body['messages'])
+                          if message['role'] == 'user'), "")
+        message = {"role": "assistant", "content": None}
+        tools = body.get('tools') or []
+        if tools:
+            function = tools[0]['function']
+            parameter = next(iter(function['parameters']['properties']), 'text')
+            if random.random() < wrong_argument_rate:
+                parameter = f"unknown_{parameter}"
+            arguments = json.dumps({parameter: user_text})
+            if random.random() < malformed_rate:
+                arguments = arguments[:len(arguments) // 2]
+            message['tool_calls'] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": function['name'], "arguments": arguments},
+            }]
+        else:
+            message['content'] = "No tools available."
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'fake'),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if tools else "stop", "logprobs": None}],
+            "usage": {"prompt_tokens": len(user_text.split()), "completion_tokens": 1,
+                      "total_tokens": len(user_text.split()) + 1},
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions endpoint.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds before each response.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of requests failing with 429 or 500.")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Fraction of tool calls with invalid JSON arguments.")
+    parser.add_argument('--wrong-argument-rate', type=float, default=0.0, help="Fraction of tool calls naming an unknown parameter.")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    print("Point the agent path at this endpoint with:")
+    print(f"  export OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 OPENAI_API_KEY=fake PROCESSING_MODE=agent")
+    uvicorn.run(create_app(args.latency, args.failure_rate, args.malformed_rate, args.wrong_argument_rate), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,40 @@
 import sys
 import os
-from backend.app.utils.logging_config import logger
+import argparse
 
 # Add the project root directory to the Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
-from backend.app.database.file_ingest import ingest_source_document
-
-def read_source_files(source_folder):
-    source_docs = []
-    if not os.path.exists(source_folder):
-        logger.error(f"The directory {source_folder} does not exist.")
-        return source_docs
-
-    for file_name in os.listdir(source_folder):
-        file_path = os.path.join(source_folder, file_name)
-        if os.path.isfile(file_path):
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                source_docs.append((file_name, content))
-                logger.info(f"Read source file: {file_name}")
-    return source_docs
+from backend.app.database.file_ingest import INGEST_WORKERS, SOURCE_DOCS_PATH, ingest_corpus
+from backend.app.utils.fingerprints import DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW
+from backend.app.utils.logging_config import logger, setup_logging
 
 def main():
-    logger.info("Starting source document ingestion")
-    source_folder = os.path.join(project_root, 'source_documents')
-    source_docs = read_source_files(source_folder)
-    
-    if not source_docs:
-        logger.warning("No source documents found.")
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Incrementally fingerprint the source document corpus.")
+    parser.add_argument('--source-dir', default=SOURCE_DOCS_PATH)
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="Number of ingestion processes.")
+    parser.add_argument('--ngram-size', type=int, default=DEFAULT_NGRAM_SIZE)
+    parser.add_argument('--window', type=int, default=FINGERPRINT_WINDOW)
+    parser.add_argument('--no-segment', action='store_true', help="Do not rebuild the corpus segment afterwards.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source_dir):
+        logger.error(f"The directory {args.source_dir} does not exist.")
         return
 
-    for file_name, content in source_docs:
-        ingest_source_document(file_name, content)
-        logger.info(f"Ingested: {file_name}")
+    logger.info("Starting source document ingestion")
+    stats = ingest_corpus(args.source_dir, args.ngram_size, args.window, args.workers, not args.no_segment)
+    if not stats['scanned']:
+        logger.warning("No source documents found.")
 
-    logger.info("Source document ingestion completed")
+    print(
+        f"Scanned {stats['scanned']} documents: {stats['ingested']} ingested, {stats['unchanged']} unchanged, "
+        f"{stats['skipped']} skipped, {stats['deleted']} deleted, {stats['failed']} failed.\n"
+        f"Read {stats['bytes'] / 1048576:.1f} MB in {stats['seconds']:.2f}s "
+        f"({stats['docs_per_second']:.1f} docs/s, {stats['mb_per_second']:.2f} MB/s)."
+    )
 
 if __name__ == "__main__":
     main()
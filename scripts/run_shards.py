@@ -0,0 +1,50 @@
+import os
+import sys
+import secrets
+import argparse
+import multiprocessing
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.agents.shards import SHARD_AUTHKEY, serve_shard
+from backend.app.utils.fingerprints import DEFAULT_NGRAM_SIZE, FINGERPRINT_WINDOW
+from backend.app.utils.logging_config import logger, setup_logging
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Run every shard of the source index as a local process.")
+    parser.add_argument('--shards', type=int, default=4, help="Number of shard processes.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--base-port', type=int, default=6000, help="Shard i listens on base-port + i.")
+    parser.add_argument('--ngram-size', type=int, default=DEFAULT_NGRAM_SIZE)
+    parser.add_argument('--window', type=int, default=FINGERPRINT_WINDOW)
+    args = parser.parse_args()
+
+    authkey = SHARD_AUTHKEY or secrets.token_hex(16)
+    addresses = [(args.host, args.base_port + shard) for shard in range(args.shards)]
+    processes = []
+    for shard, address in enumerate(addresses):
+        process = multiprocessing.Process(
+            target=serve_shard,
+            args=(address, shard, args.shards, authkey.encode(), args.ngram_size, args.window),
+            name=f"shard-{shard}",
+        )
+        process.start()
+        processes.append(process)
+
+    print("Shard servers starting. Point the API at them with:")
+    print(f"  export SHARD_ADDRESSES={','.join(f'{host}:{port}' for host, port in addresses)}")
+    print(f"  export SHARD_AUTHKEY={authkey}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping shard servers")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import requests
 import os
-import time
+import json
 import sys
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.app.utils.logging_config import logger
+from backend.app.utils.logging_config import logger, setup_logging
 
 API_URL = "http://localhost:8000/upload"
+BATCH_API_URL = "http://localhost:8000/upload/batch"
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 1000))
 
 def upload_document(file_path: str):
     """
@@ -24,11 +26,82 @@ def upload_document(file_path: str):
     logger.info(f"Upload response: {response.json()}")
     return response.json()
 
+def upload_batch(directory: str):
+    """
+    Uploads every .txt file of a directory, as one batch per MAX_BATCH_FILES documents.
+
+    Only the files of the batch being posted are open at a time.
+
+    :param directory: Directory containing the documents to upload.
+    :return: List with the server's response to each batch.
+    """
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.txt'))
+    logger.info(f"Uploading {len(paths)} documents from {directory}")
+    responses = []
+    for start in range(0, len(paths), MAX_BATCH_FILES):
+        chunk = paths[start:start + MAX_BATCH_FILES]
+        handles = []
+        try:
+            for path in chunk:
+                handles.append(open(path, 'rb'))
+            files = [('files', (os.path.basename(path), f, 'text/plain')) for path, f in zip(chunk, handles)]
+            response = requests.post(BATCH_API_URL, files=files)
+        finally:
+            for f in handles:
+                f.close()
+        logger.info(f"Batch upload of {len(chunk)} documents, response status: {response.status_code}")
+        responses.append(response.json())
+    return responses
+
+def wait_for_completion(events_url: str) -> dict:
+    """
+    Follows the server-sent status events of a document until it completes or fails.
+
+    :param events_url: URL of the document's /events stream.
+    :return: The final status.
+    """
+    with requests.get(events_url, stream=True, headers={"Accept": "text/event-stream"}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            status = json.loads(line[len("data:"):])
+            if status["status"] in ("completed", "failed"):
+                return status
+            print(f"Status: {status['status']} ({status.get('progress', 0)}%)")
+    raise RuntimeError("Status stream closed before processing finished.")
+
+def process_batch(directory: str):
+    """
+    Uploads a directory in batches and waits for every document to finish.
+
+    :param directory: Directory containing the documents to upload.
+    """
+    documents = []
+    for response in upload_batch(directory):
+        if not response.get("batch_id"):
+            logger.error(f"Failed to upload batch. Response: {response}")
+            continue
+        print(f"Batch {response['batch_id']} uploaded with {len(response['documents'])} documents.")
+        documents.extend(response["documents"])
+    for document in documents:
+        try:
+            final_status = wait_for_completion(f"http://localhost:8000/events/{document['document_id']}")
+        except Exception as e:
+            print(f"Error checking status of {document['filename']}: {e}")
+            continue
+        print(f"{document['filename']}: {final_status['status']} "
+              f"(report: http://localhost:8000/report/{document['document_id']})")
+
 def main():
-    document_path = input("Enter the path to the document you want to upload: ").strip()
+    setup_logging()
+    document_path = input("Enter the path to the document or directory you want to upload: ").strip()
     if not os.path.exists(document_path):
         logger.error("File does not exist.")
         return
+    if os.path.isdir(document_path):
+        process_batch(document_path)
+        return
     
     response = upload_document(document_path)
     if response.get("document_id"):
@@ -37,25 +110,18 @@ def main():
         print(f"Document uploaded successfully. Document ID: {document_id}")
         print("Processing document for plagiarism detection...")
         
-        # Polling for status
-        status_url = f"http://localhost:8000/status/{document_id}"
+        events_url = f"http://localhost:8000/events/{document_id}"
         report_url = f"http://localhost:8000/report/{document_id}"
         
-        while True:
-            try:
-                status_response = requests.get(status_url).json()
-                if status_response["status"] == "completed":
-                    print("Processing completed.")
-                    break
-                elif status_response["status"] == "processing":
-                    print("Still processing... Waiting for 5 seconds.")
-                    time.sleep(5)
-                else:
-                    print("Unknown status received.")
-                    break
-            except Exception as e:
-                print(f"Error checking status: {e}")
-                return
+        try:
+            final_status = wait_for_completion(events_url)
+        except Exception as e:
+            print(f"Error checking status: {e}")
+            return
+        if final_status["status"] == "failed":
+            print(f"Processing failed: {final_status.get('error')}")
+            return
+        print("Processing completed.")
         
         # Retrieve the report
         try:
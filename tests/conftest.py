@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Settings are read when the backend modules are imported, and detection
+# workers are spawned processes that inherit the environment, so the scratch
+# corpus and log file are configured before anything is imported.
+SOURCE_DIR = tempfile.mkdtemp(prefix="plagiarism-tests-sources-")
+os.environ['SOURCE_DOCS_PATH'] = SOURCE_DIR
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), "plagiarism-tests.log"))
+os.environ['SOURCE_INDEX_REFRESH_INTERVAL'] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+import uvicorn
+
+from backend.app.agents import llm_client
+from backend.app.processors.document_processor import run_agent_pipeline
+from scripts.fake_llm_server import create_app
+
+DOCUMENT = "Introduction\nThe opening words.\nBody\nThe main argument.\nConclusion\nThe closing words.\n"
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    servers = []
+
+    def start(max_in_flight: int = 2, **options) -> str:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(create_app(**options), host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        servers.append((server, thread))
+
+        base_url = f"http://127.0.0.1:{port}"
+        monkeypatch.setenv('OPENAI_BASE_URL', f"{base_url}/v1")
+        monkeypatch.setenv('OPENAI_API_KEY', "fake")
+        monkeypatch.setattr(llm_client, 'LLM_BACKOFF_BASE', 0.01)
+        client = llm_client.LLMClient(max_in_flight=max_in_flight, max_retries=10)
+        monkeypatch.setattr(llm_client, '_llm_client', client)
+        servers.append((client, None))
+        return base_url
+
+    yield start
+    for resource, thread in reversed(servers):
+        if thread is None:
+            resource.close()
+        else:
+            resource.should_exit = True
+            thread.join()
+
+def _stats(base_url):
+    return httpx.get(f"{base_url}/stats").json()
+
+def test_requests_in_flight_are_capped(fake_llm):
+    base_url = fake_llm(max_in_flight=2, latency=0.1)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        reports = list(executor.map(run_agent_pipeline, [DOCUMENT] * 4))
+    stats = _stats(base_url)
+    assert stats['requests'] == 12
+    assert stats['peak_in_flight'] == 2
+    assert all(report.count(" result:\n") == 3 for report in reports)
+
+def test_failed_requests_are_retried(fake_llm):
+    base_url = fake_llm(max_in_flight=4, latency=0.0, failure_rate=0.5)
+    reports = [run_agent_pipeline(DOCUMENT) for _ in range(4)]
+    stats = _stats(base_url)
+    assert stats['failures'] > 0
+    assert stats['requests'] == 12 + stats['failures']
+    assert all(report.count(" result:\n") == 3 for report in reports)
+
+def test_malformed_tool_arguments_become_errors(fake_llm):
+    fake_llm(latency=0.0, malformed_rate=1.0)
+    report = run_agent_pipeline(DOCUMENT)
+    for name in ("analyze_introduction", "analyze_body", "analyze_conclusion"):
+        assert f"{name} result:\nError: malformed arguments for {name}" in report
+
+def test_unexpected_tool_arguments_become_errors(fake_llm):
+    fake_llm(latency=0.0, wrong_argument_rate=1.0)
+    report = run_agent_pipeline(DOCUMENT)
+    for name in ("analyze_introduction", "analyze_body", "analyze_conclusion"):
+        assert f"{name} result:\nError: invalid arguments for {name}" in report
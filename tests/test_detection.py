@@ -0,0 +1,96 @@
+import os
+import random
+import shutil
+
+import pytest
+
+from backend.app.agents import rabin_karp
+from backend.app.agents.rabin_karp import SOURCE_DOCS_PATH as SOURCE_DIR, SourceIndex, detect_passages
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+def _write(name: str, words):
+    with open(os.path.join(SOURCE_DIR, name), 'w', encoding='utf-8') as f:
+        f.write(" ".join(words) + "\n")
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(0)
+    sources = {f"source{i}.txt": [rng.choice(WORDS) for _ in range(300)] for i in range(6)}
+    for name, words in sources.items():
+        _write(name, words)
+    yield sources
+    if rabin_karp._detection_pool is not None:
+        rabin_karp._detection_pool.shutdown()
+        rabin_karp._detection_pool = None
+    for entry in os.listdir(SOURCE_DIR):
+        path = os.path.join(SOURCE_DIR, entry)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+def _target(sources):
+    rng = random.Random(1)
+    return " ".join(
+        [rng.choice(WORDS) for _ in range(50)] + sources["source1.txt"][20:80]
+        + [rng.choice(WORDS) for _ in range(50)] + sources["source4.txt"][100:140]
+    )
+
+def _spans(result):
+    return sorted(
+        (source['source_document'], passage['target_start'], passage['target_end'], passage['source_start'])
+        for source in result['sources'] for passage in source['passages']
+    )
+
+def test_parallel_detection_matches_serial(corpus):
+    target = _target(corpus)
+    serial = detect_passages(target, n=5, workers=1)
+    parallel = detect_passages(target, n=5, workers=2)
+    assert _spans(serial) == [("source1.txt", 50, 110, 20), ("source4.txt", 160, 200, 100)]
+    assert _spans(parallel) == _spans(serial)
+
+def test_engines_agree_with_segment_and_delta(corpus, monkeypatch):
+    target = _target(corpus)
+    # A threshold of 0 puts every document in a fresh segment
+    index = SourceIndex(5, source_dir=SOURCE_DIR, refresh_interval=0, rebuild_threshold=0)
+    index.refresh()
+    index.rebuild_threshold = 64
+    monkeypatch.setitem(rabin_karp._source_indexes, (5, rabin_karp.FINGERPRINT_WINDOW), index)
+    assert len(index.segment.docs) == len(corpus)
+    assert index.tokens("source4.txt").tolist() == rabin_karp.token_array(corpus["source4.txt"]).tolist()
+    expected = _spans(detect_passages(target, n=5, engine='python', workers=1))
+    assert _spans(detect_passages(target, n=5, engine='numpy', workers=1)) == expected
+
+    # source4.txt changes: its segment entries are masked and its new text goes to the delta
+    changed = ["changed"] * 10 + corpus["source4.txt"][100:140]
+    _write("source4.txt", changed)
+    os.utime(os.path.join(SOURCE_DIR, "source4.txt"), ns=(2, 2))
+    index.refresh(force=True)
+    assert "source4.txt" in index._masked and "source4.txt" in index._delta_files
+    assert index.tokens("source4.txt").tolist() == rabin_karp.token_array(changed).tolist()
+    expected = _spans(detect_passages(target, n=5, engine='python', workers=1))
+    assert expected == [("source1.txt", 50, 110, 20), ("source4.txt", 160, 200, 10)]
+    assert _spans(detect_passages(target, n=5, engine='numpy', workers=1)) == expected
+    _write("source4.txt", corpus["source4.txt"])
+
+def _postings(indexes, words):
+    return sorted(posting for h, _ in rabin_karp.rolling_hashes(words, 5)
+                  for index in indexes for posting in index.lookup(h))
+
+def test_sharded_index_refreshes_after_a_change(corpus):
+    full = SourceIndex(5, source_dir=SOURCE_DIR, refresh_interval=0)
+    shards = [SourceIndex(5, source_dir=SOURCE_DIR, refresh_interval=0, shard=shard, shards=2) for shard in range(2)]
+    for index in [full] + shards:
+        index.refresh()
+    original = corpus["source2.txt"]
+    assert _postings(shards, original) == _postings([full], original)
+    # Hits of any shard can point into any document, so every shard holds all token IDs
+    assert all(index.tokens("source2.txt").tolist() == full.tokens("source2.txt").tolist() != [] for index in shards)
+
+    changed = original[:150] + [f"fresh{i}" for i in range(150)]
+    _write("source2.txt", changed)
+    os.utime(os.path.join(SOURCE_DIR, "source2.txt"), ns=(1, 1))
+    for index in [full] + shards:
+        index.refresh(force=True)
+
+    assert _postings(shards, changed) == _postings([full], changed)
+    assert ("source2.txt", 200) in _postings(shards, changed)
+    assert ("source2.txt", 200) not in _postings(shards, original)
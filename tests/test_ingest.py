@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from backend.app.database import file_ingest
+from backend.app.database.fingerprint_store import fingerprint_file_path
+
+def test_unchanged_file_is_not_fingerprinted_again(tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("one two three four five six seven eight nine ten\n")
+    sha256, _, _, changed = file_ingest._ingest_file(path, 5, 4, None)
+    assert changed and os.path.exists(fingerprint_file_path(path))
+
+    def fail(*args, **kwargs):
+        pytest.fail("unchanged content was fingerprinted")
+
+    monkeypatch.setattr(file_ingest, 'fingerprint_words', fail)
+    os.utime(path, ns=(1, 1))
+    assert file_ingest._ingest_file(path, 5, 4, sha256) == (sha256, os.path.getsize(path), 1, False)
+
+    monkeypatch.undo()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("eleven twelve\n")
+    new_sha256, _, _, changed = file_ingest._ingest_file(path, 5, 4, sha256)
+    assert changed and new_sha256 != sha256
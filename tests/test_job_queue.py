@@ -0,0 +1,48 @@
+import time
+
+from backend.app.jobs.job_queue import COMPLETED, QUEUED, RUNNING, JobQueue
+
+def test_live_leases_are_not_recovered(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = JobQueue(path, lease_seconds=60), JobQueue(path, lease_seconds=60)
+    first.enqueue("doc-1")
+    assert second.status("doc-1")['state'] == QUEUED
+    assert first.claim(1) == ["doc-1"]
+
+    # A second process starting up leaves the job to its owner
+    assert second.recover() == 0
+    assert second.claim(1) == []
+    assert second.status("doc-1")['state'] == RUNNING
+
+    first.complete("doc-1")
+    assert second.status("doc-1")['state'] == COMPLETED
+    assert second.depth() == 0
+
+def test_expired_leases_are_recovered_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    crashed, survivor = JobQueue(path, lease_seconds=0.05), JobQueue(path, lease_seconds=60)
+    crashed.enqueue("doc-1")
+    assert crashed.claim(1) == ["doc-1"]
+    time.sleep(0.1)
+
+    assert survivor.recover() == 1
+    assert survivor.depth() == 1
+    assert survivor.claim(1) == ["doc-1"]
+    assert survivor.status("doc-1")['attempts'] == 2
+
+    # The old owner's late outcome is ignored
+    assert crashed.fail("doc-1", "stale") is None
+    crashed.complete("doc-1")
+    assert survivor.status("doc-1")['state'] == RUNNING
+    survivor.complete("doc-1")
+    assert crashed.status("doc-1")['state'] == COMPLETED
+
+def test_renewed_leases_survive(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    owner, other = JobQueue(path, lease_seconds=0.2), JobQueue(path, lease_seconds=0.2)
+    owner.enqueue("doc-1")
+    owner.claim(1)
+    for _ in range(3):
+        time.sleep(0.1)
+        owner.renew_leases()
+        assert other.recover() == 0
@@ -0,0 +1,16 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.app.utils import logging_config
+
+def _log(message):
+    logging_config.logger.warning(message)
+
+def test_forked_workers_write_their_own_records(tmp_path, monkeypatch):
+    log_file = tmp_path / "logs" / "app.log"
+    monkeypatch.setattr(logging_config, 'LOG_FILE', str(log_file))
+    logging_config.setup_logging()
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('fork'),
+                             initializer=logging_config.setup_logging) as executor:
+        list(executor.map(_log, [f"record from worker {i}" for i in range(4)]))
+    assert all(f"record from worker {i}" in log_file.read_text() for i in range(4))
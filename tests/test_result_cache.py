@@ -0,0 +1,30 @@
+import os
+import time
+
+from backend.app.database.result_cache import ResultCache, corpus_version
+from backend.app.processors.document_processor import result_key
+
+def test_result_key_accepts_invalid_utf8(tmp_path):
+    latin1 = tmp_path / "latin1.txt"
+    latin1.write_bytes("Introduction\nCafé crème brûlée\n".encode('latin-1'))
+    replaced = tmp_path / "replaced.txt"
+    replaced.write_text("Introduction\nCaf� cr�me br�l�e\n", encoding='utf-8')
+    assert result_key(str(latin1), 'local') == result_key(str(replaced), 'local')
+
+def test_results_of_an_older_corpus_are_not_served(tmp_path):
+    api = ResultCache(str(tmp_path / "results.db"))
+    worker = ResultCache(str(tmp_path / "results.db"))
+    old, new = f"{1:020d}-old", f"{2:020d}-new"
+    worker.get("key", old)
+    api.put("key", new, "doc-new")
+    worker.put("key", old, "doc-old")
+    assert api.get("key", new) == "doc-new"
+    worker.put("other", old, "doc-old")
+    assert api.get("other", new) is None
+    assert worker.get("key", old) is None
+
+def test_corpus_versions_order_by_age(tmp_path):
+    (tmp_path / "a.txt").write_text("first")
+    before = corpus_version(str(tmp_path), max_age=0)
+    os.utime(tmp_path / "a.txt", ns=(time.time_ns() + 10**9,) * 2)
+    assert corpus_version(str(tmp_path), max_age=0) > before